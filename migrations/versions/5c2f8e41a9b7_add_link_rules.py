@@ -0,0 +1,38 @@
+"""Add link redirect rules
+
+Revision ID: 5c2f8e41a9b7
+Revises: d0815340b466
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c2f8e41a9b7'
+down_revision: Union[str, None] = 'd0815340b466'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('link_rules',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('link_id', sa.Integer(), nullable=False),
+    sa.Column('priority', sa.Integer(), nullable=False),
+    sa.Column('country', sa.String(length=2), nullable=True),
+    sa.Column('device', sa.String(length=10), nullable=True),
+    sa.Column('weight', sa.Integer(), nullable=False),
+    sa.Column('target_url', sa.String(length=2048), nullable=False),
+    sa.ForeignKeyConstraint(['link_id'], ['links.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_link_rules_link_id'), 'link_rules', ['link_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_link_rules_link_id'), table_name='link_rules')
+    op.drop_table('link_rules')
@@ -1,30 +1,248 @@
-import redis.asyncio as redis
+import asyncio
 import json
+import logging
+import time
+from collections import OrderedDict
 from contextlib import asynccontextmanager
-from src.config import REDIS_URL
+from src.cache_keys import tag_key, version_key
+from src.profiling import span
+from src.config import (
+    REDIS_URL, LOCAL_CACHE_SIZE, LOCAL_CACHE_TTL, REDIS_TIMEOUT, CACHE_BREAKER_THRESHOLD, CACHE_BREAKER_RESET
+)
+
+logger = logging.getLogger(__name__)
 
 redis_client = None
 
+# Сколько команд отправлять одним пайплайном, чтобы он укладывался в REDIS_TIMEOUT
+PIPELINE_CHUNK = 1000
+
+# Поле версионированной записи: версия пространства, под которой запись собрана.
+# Отсутствующий счётчик версии считается нулём: записи живут меньше VERSION_TTL,
+# поэтому запись с версией 0 не переживает истечение уже поднятого счётчика
+VERSION_FIELD = "_v"
+
+# Ответ cache_execute, когда до Redis достучаться не удалось
+_UNAVAILABLE = object()
+
+
+class LocalCache:
+    """Небольшой in-process LRU с TTL поверх Redis для самых горячих ключей."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, key: str) -> any:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: any, ttl: float | None = None):
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+
+class CircuitBreaker:
+    """Размыкается после `failure_threshold` ошибок подряд и через `reset_timeout` пропускает пробный запрос."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info("Redis circuit closed")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning("Redis circuit opened after %d failures", self.failures)
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def cancel_probe(self):
+        self._probing = False
+
+
+local_cache = LocalCache(LOCAL_CACHE_SIZE, LOCAL_CACHE_TTL)
+breaker = CircuitBreaker(CACHE_BREAKER_THRESHOLD, CACHE_BREAKER_RESET)
+
 
 @asynccontextmanager
 async def get_redis():
     global redis_client
     if redis_client is None:
-        redis_client = redis.from_url(REDIS_URL)
+        # Клиент redis импортируется при первом обращении к кэшу, а не при импорте приложения
+        import redis.asyncio as redis
+        redis_client = redis.from_url(REDIS_URL, socket_timeout=REDIS_TIMEOUT, socket_connect_timeout=REDIS_TIMEOUT)
     try:
         yield redis_client
     finally:
         pass
 
-async def cache_set(key: str, value: any, ttl: int = 3600):
-    async with get_redis() as client:
-        await client.setex(key, ttl, json.dumps(value))
+def _cache_errors() -> tuple:
+    from redis.exceptions import RedisError
+    return RedisError, OSError, asyncio.TimeoutError
+
+async def cache_execute(operation, default: any = None) -> any:
+    """Выполняет `operation(client)` с таймаутом через предохранитель; `default`, если Redis недоступен."""
+    if not breaker.allow():
+        return default
+    try:
+        with span("cache"):
+            async with get_redis() as client:
+                result = await asyncio.wait_for(operation(client), REDIS_TIMEOUT)
+    except _cache_errors() as exc:
+        breaker.record_failure()
+        logger.debug("Redis call failed: %r", exc)
+        return default
+    except BaseException:
+        # Отмена запроса ничего не говорит о здоровье Redis
+        breaker.cancel_probe()
+        raise
+    breaker.record_success()
+    return result
+
+async def cache_set(key: str, value: any, ttl: int = 3600, tags: tuple[str, ...] = ()):
+    """Пишет в оба уровня; `tags` регистрируют ключ для `invalidate_tags`."""
+    local_cache.set(key, value, ttl)
+    if not tags:
+        await cache_execute(lambda client: client.setex(key, ttl, json.dumps(value)))
+        return
+
+    async def operation(client):
+        pipe = client.pipeline(transaction=False)
+        pipe.setex(key, ttl, json.dumps(value))
+        for tag in tags:
+            pipe.sadd(tag_key(tag), key)
+            pipe.expire(tag_key(tag), ttl)
+        return await pipe.execute()
+
+    await cache_execute(operation)
+
+def _superseded(key: str, value: any) -> bool:
+    """True, если в локальном уровне уже лежит более новая версия записи."""
+    version = value.get(VERSION_FIELD) if isinstance(value, dict) else None
+    if version is None:
+        return False
+    current = local_cache.get(key)
+    return isinstance(current, dict) and (current.get(VERSION_FIELD) or 0) > version
+
+async def cache_set_versioned(key: str, value: dict, version: int | None, ttl: int = 3600):
+    """Сохраняет `value` с версией пространства, прочитанной до выборки данных."""
+    value = {**value, VERSION_FIELD: version}
+    if _superseded(key, value):
+        return
+    await cache_set(key, value, ttl)
+
+async def cache_set_many(items: dict[str, any], ttl: int = 3600):
+    for key, value in items.items():
+        if not _superseded(key, value):
+            local_cache.set(key, value, ttl)
+
+    async def operation(client):
+        pipe = client.pipeline(transaction=False)
+        for key, value in items.items():
+            pipe.setex(key, ttl, json.dumps(value))
+        return await pipe.execute()
+
+    await cache_execute(operation)
 
 async def cache_get(key: str) -> any:
-    async with get_redis() as client:
-        value = await client.get(key)
-        return json.loads(value) if value else None
+    value = local_cache.get(key)
+    if value is not None:
+        return value
+    value = await cache_execute(lambda client: client.get(key))
+    value = json.loads(value) if value else None
+    if value is not None:
+        local_cache.set(key, value)
+    return value
+
+async def cache_get_versioned(key: str, scope: str) -> dict | None:
+    """Как `cache_get`, но запись используется, только пока её версия совпадает с текущей."""
+    value = local_cache.get(key)
+    if value is not None:
+        current = await cache_execute(lambda client: client.get(version_key(scope)), default=_UNAVAILABLE)
+        if current is _UNAVAILABLE or value.get(VERSION_FIELD) == int(current or 0):
+            return value
+        local_cache.delete(key)
+    result = await cache_execute(lambda client: client.mget(key, version_key(scope)))
+    if not result or result[0] is None:
+        return None
+    value = json.loads(result[0])
+    if value.get(VERSION_FIELD) != int(result[1] or 0):
+        return None
+    local_cache.set(key, value)
+    return value
 
 async def cache_delete(key: str):
-    async with get_redis() as client:
-        await client.delete(key)
\ No newline at end of file
+    local_cache.delete(key)
+    await cache_execute(lambda client: client.delete(key))
+
+
+async def cache_delete_many(keys: list[str]):
+    for key in keys:
+        local_cache.delete(key)
+    for offset in range(0, len(keys), PIPELINE_CHUNK):
+        chunk = keys[offset:offset + PIPELINE_CHUNK]
+        await cache_execute(lambda client: client.unlink(*chunk))
+
+
+async def invalidate_tags(*tags: str):
+    """Удаляет все ключи, зарегистрированные под тегами, и сами наборы тегов."""
+    tag_keys = [tag_key(tag) for tag in tags]
+    for offset in range(0, len(tag_keys), PIPELINE_CHUNK):
+        chunk = tag_keys[offset:offset + PIPELINE_CHUNK]
+
+        async def operation(client):
+            pipe = client.pipeline(transaction=False)
+            for key in chunk:
+                pipe.smembers(key)
+            members = {member.decode() for group in await pipe.execute() for member in group}
+            await client.unlink(*members, *chunk)
+            return members
+
+        for key in await cache_execute(operation, default=set()):
+            local_cache.delete(key)
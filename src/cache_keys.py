@@ -0,0 +1,45 @@
+"""Реестр ключей кэша: записи привязаны к пространствам версий `ver:{scope}`,
+теги `tag:{tag}` собирают ключи, которые нельзя вычислить заранее."""
+
+
+def owner(user_id: int | None) -> str:
+    return str(user_id) if user_id is not None else "anon"
+
+
+# Пространства версий
+def link_scope(short_code: str) -> str:
+    return f"link:{short_code}"
+
+def stats_scope(short_code: str) -> str:
+    return f"stats:{short_code}"
+
+def user_scope(user_id: int | None) -> str | None:
+    return f"user:{user_id}" if user_id is not None else None
+
+def search_scope(user_id: int | None) -> str:
+    return f"search:{owner(user_id)}"
+
+def version_key(scope: str) -> str:
+    return f"ver:{scope}"
+
+def version_ts_key(scope: str) -> str:
+    return f"ver_ts:{scope}"
+
+
+# Записи
+def link_key(short_code: str) -> str:
+    return f"link:{short_code}"
+
+def stats_key(short_code: str) -> str:
+    return f"link_stats:{short_code}"
+
+def search_key(original_url: str, user_id: int | None, version: int) -> str:
+    return f"search:{owner(user_id)}:v{version}:{original_url}"
+
+
+# Теги
+def tag_key(tag: str) -> str:
+    return f"tag:{tag}"
+
+def url_tag(original_url: str) -> str:
+    return f"url:{original_url}"
@@ -0,0 +1,122 @@
+import argparse
+import asyncio
+import logging
+import time
+from pathlib import Path
+
+from sqlalchemy import inspect, text
+
+from src.config import WARMUP_LIMIT, WARMUP_BATCH_SIZE, WARMUP_BATCH_PAUSE, IMPORT_CHUNK_SIZE
+from src.database import dispose_engine, get_engine
+from src.services.warmup_service import CacheWarmer
+from src.services.bloom_service import link_filter
+from src.services.import_service import import_links
+
+
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+
+# Схема, созданная через Base.metadata.create_all без Alembic, соответствует последней
+# миграции, чья таблица уже есть в базе: до неё ревизию ставим через stamp
+CREATE_ALL_STAMPS = (("link_imports", "8e3b1f6c2d47"), ("link_rules", "5c2f8e41a9b7"), ("links", "d0815340b466"))
+
+
+def stamp_revision(tables: set[str]) -> str | None:
+    """Ревизия, которой уже соответствует схема без alembic_version; None для пустой базы."""
+    for table, revision in CREATE_ALL_STAMPS:
+        if table in tables:
+            return revision
+    return None
+
+
+async def migrate(args):
+    from alembic import command
+    from alembic.config import Config
+
+    try:
+        async with get_engine().connect() as conn:
+            tables = set(await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_table_names()))
+            current = []
+            if "alembic_version" in tables:
+                current = (await conn.execute(text("SELECT version_num FROM alembic_version"))).scalars().all()
+    finally:
+        await dispose_engine()
+
+    config = Config(str(ALEMBIC_INI))
+    revision = None if current else stamp_revision(tables)
+    if revision:
+        print(f"Schema was created without migrations, stamping revision {revision}")
+        await asyncio.to_thread(command.stamp, config, revision)
+    await asyncio.to_thread(command.upgrade, config, "head")
+
+
+async def warmup(args):
+    warmer = CacheWarmer(limit=args.limit, batch_size=args.batch_size, pause=args.pause)
+    start = time.perf_counter()
+    try:
+        await warmer.run()
+    finally:
+        await dispose_engine()
+    print(f"Warmed {warmer.loaded}/{warmer.total} links in {time.perf_counter() - start:.1f}s")
+
+
+async def bloom_rebuild(args):
+    start = time.perf_counter()
+    try:
+        rebuilt = await link_filter.rebuild()
+    finally:
+        await dispose_engine()
+    if rebuilt:
+        print(f"Bloom filter rebuilt in {time.perf_counter() - start:.1f}s")
+    else:
+        print("Bloom filter rebuild skipped: another rebuild is running or Redis is unavailable")
+
+
+async def import_file(args):
+    fmt = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+    try:
+        with open(args.path, encoding="utf-8", newline="") as stream:
+            report = await import_links(
+                stream, fmt, user_id=args.user_id, chunk_size=args.chunk_size, import_id=args.import_id,
+            )
+    except ValueError as exc:
+        raise SystemExit(f"Import failed: {exc}")
+    finally:
+        await dispose_engine()
+    print(report.as_dict())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m src.cli", description="Link Shortener maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = commands.add_parser(
+        "migrate", help="Apply Alembic migrations, stamping schemas created without them first"
+    )
+    migrate_parser.set_defaults(handler=migrate)
+
+    warmup_parser = commands.add_parser("warmup", help="Load the hottest links into Redis")
+    warmup_parser.add_argument("--limit", type=int, default=WARMUP_LIMIT)
+    warmup_parser.add_argument("--batch-size", type=int, default=WARMUP_BATCH_SIZE)
+    warmup_parser.add_argument("--pause", type=float, default=WARMUP_BATCH_PAUSE, help="Seconds to sleep between batches")
+    warmup_parser.set_defaults(handler=warmup)
+
+    bloom_parser = commands.add_parser("bloom-rebuild", help="Rebuild the short-code Bloom filter from the database")
+    bloom_parser.set_defaults(handler=bloom_rebuild)
+
+    import_parser = commands.add_parser("import", help="Bulk import links from a CSV or NDJSON file")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--format", choices=["csv", "ndjson"], help="Defaults to the file extension")
+    import_parser.add_argument("--user-id", type=int, help="Owner of the imported links")
+    import_parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    import_parser.add_argument(
+        "--import-id", help="Commit progress under this id; rerunning with the same id resumes an interrupted import"
+    )
+    import_parser.set_defaults(handler=import_file)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,12 @@
 import os
+from pathlib import Path
 
-from dotenv import load_dotenv
+# .env ищем только в корне проекта: python-dotenv импортируется, лишь если файл есть
+ENV_FILE = Path(__file__).resolve().parent.parent / ".env"
+if ENV_FILE.is_file():
+    from dotenv import load_dotenv
 
-load_dotenv()
+    load_dotenv(ENV_FILE)
 
 DB_USER = os.getenv("DB_USER")
 DB_PASS = os.getenv("DB_PASS")
@@ -17,4 +21,73 @@ REDIS_PORT = os.getenv("REDIS_PORT", "6379")
 REDIS_DB = os.getenv("REDIS_DB", "0")
 REDIS_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}"
 
-SECRET = os.getenv("SECRET", "YOUR_SECRET_HERE")
\ No newline at end of file
+SECRET = os.getenv("SECRET", "YOUR_SECRET_HERE")
+
+# Локальный (in-process) кэш поверх Redis; LOCAL_CACHE_TTL=0 отключает его
+LOCAL_CACHE_SIZE = int(os.getenv("LOCAL_CACHE_SIZE", "10000"))
+LOCAL_CACHE_TTL = float(os.getenv("LOCAL_CACHE_TTL", "5"))
+
+# Прогрев кэша при старте; WARMUP_LIMIT=0 отключает прогрев
+WARMUP_LIMIT = int(os.getenv("WARMUP_LIMIT", "1000"))
+WARMUP_BATCH_SIZE = int(os.getenv("WARMUP_BATCH_SIZE", "200"))
+WARMUP_BATCH_PAUSE = float(os.getenv("WARMUP_BATCH_PAUSE", "0.05"))
+WARMUP_READY_FRACTION = float(os.getenv("WARMUP_READY_FRACTION", "0.5"))
+WARMUP_READY_TIMEOUT = float(os.getenv("WARMUP_READY_TIMEOUT", "30"))
+
+# Клики копятся в памяти воркера и раз в CLICK_FLUSH_INTERVAL секунд пишутся в БД
+CLICK_FLUSH_INTERVAL = float(os.getenv("CLICK_FLUSH_INTERVAL", "5"))
+
+
+# Таймауты и проверки зависимостей
+DB_CONNECT_TIMEOUT = float(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+DB_DOWN_COOLDOWN = float(os.getenv("DB_DOWN_COOLDOWN", "5"))
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "1"))
+
+# Адаптивный лимит одновременных запросов (AIMD) для сброса нагрузки
+LIMITER_INITIAL = int(os.getenv("LIMITER_INITIAL", "100"))
+LIMITER_MIN = int(os.getenv("LIMITER_MIN", "10"))
+LIMITER_MAX = int(os.getenv("LIMITER_MAX", "1000"))
+LIMITER_TARGET_LATENCY = float(os.getenv("LIMITER_TARGET_LATENCY", "0.5"))
+
+
+# Таймаут одной операции Redis и circuit breaker вокруг кэша
+REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", "0.25"))
+CACHE_BREAKER_THRESHOLD = int(os.getenv("CACHE_BREAKER_THRESHOLD", "5"))
+CACHE_BREAKER_RESET = float(os.getenv("CACHE_BREAKER_RESET", "10"))
+
+
+# Версии ссылок/пользователей для ETag; VERSION_TTL ограничивает срок жизни версии в Redis
+VERSION_TTL = int(os.getenv("VERSION_TTL", "86400"))
+EXPIRED_ETAG_WINDOW = int(os.getenv("EXPIRED_ETAG_WINDOW", "60"))
+GZIP_MINIMUM_SIZE = int(os.getenv("GZIP_MINIMUM_SIZE", "1000"))
+
+
+# Bloom-фильтр коротких кодов в Redis-битмапе. Ключи фильтра без TTL: при
+# maxmemory-policy volatile-* или noeviction Redis их не вытесняет
+BLOOM_CAPACITY = int(os.getenv("BLOOM_CAPACITY", "10000000"))
+BLOOM_ERROR_RATE = float(os.getenv("BLOOM_ERROR_RATE", "0.001"))
+BLOOM_REBUILD_INTERVAL = int(os.getenv("BLOOM_REBUILD_INTERVAL", "21600"))
+BLOOM_SCAN_BATCH = int(os.getenv("BLOOM_SCAN_BATCH", "10000"))
+# Сколько недописанных в фильтр кодов воркер держит в памяти до следующей пересборки
+BLOOM_PENDING_MAX = int(os.getenv("BLOOM_PENDING_MAX", "100000"))
+
+
+# Массовый импорт ссылок; пустой ADMIN_TOKEN отключает админский эндпоинт импорта
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "5000"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+
+# Профилирование запросов (по умолчанию выключено)
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "500"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# Сколько файлов профилей хранить в PROFILE_DIR, старые удаляются
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+LOOP_LAG_THRESHOLD_MS = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100"))
+
+
+# Правила перенаправления: CSV "network,country_code" (CIDR-блоки в стиле GeoLite2);
+# пустой GEOIP_DB_PATH отключает определение страны
+GEOIP_DB_PATH = os.getenv("GEOIP_DB_PATH", "")
+LINK_RULES_MAX = int(os.getenv("LINK_RULES_MAX", "50"))
@@ -1,25 +1,84 @@
+import logging
+import re
+from pathlib import Path
 from typing import AsyncGenerator
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
-from sqlalchemy.ext.declarative import declarative_base
-from src.config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER
-from src.base import Base
-from src.models import Link, User
+from sqlalchemy import text
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from src.config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER, DB_CONNECT_TIMEOUT
+
+logger = logging.getLogger(__name__)
 
 # Формирование строки подключения
 DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-# Создание асинхронного движка
-engine = create_async_engine(DATABASE_URL)
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations" / "versions"
+
+# Движок и фабрика сессий создаются при первом обращении: диалект asyncpg
+# заметно утяжеляет импорт, а воркеру он нужен только к первому запросу
+engine: AsyncEngine | None = None
+async_session_maker: async_sessionmaker | None = None
+
+
+def get_engine() -> AsyncEngine:
+    global engine, async_session_maker
+    if engine is None:
+        engine = create_async_engine(DATABASE_URL, connect_args={"timeout": DB_CONNECT_TIMEOUT})
+        async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    return engine
+
+
+def get_session_maker() -> async_sessionmaker:
+    get_engine()
+    return async_session_maker
 
-# Фабрика асинхронных сессий
-async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+async def dispose_engine():
+    if engine is not None:
+        await engine.dispose()
 
 # Генератор для получения сессии
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
-    async with async_session_maker() as session:
+    async with get_session_maker()() as session:
         yield session
 
-# Функция для инициализации базы данных (создание таблиц)
-async def init_db():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+
+def read_migrations(versions_dir: Path = MIGRATIONS_DIR) -> tuple[set[str], set[str]]:
+    """Все ревизии скриптов Alembic и те, на которые они ссылаются."""
+    revisions, parents = set(), set()
+    for path in versions_dir.glob("*.py"):
+        source = path.read_text(encoding="utf-8")
+        revision = re.search(r"^revision(?::[^=]+)?\s*=\s*['\"](\w+)['\"]", source, re.M)
+        down = re.search(r"^down_revision(?::[^=]+)?\s*=\s*(.+)$", source, re.M)
+        if revision:
+            revisions.add(revision.group(1))
+        if down:
+            parents.update(re.findall(r"['\"](\w+)['\"]", down.group(1)))
+    return revisions, parents
+
+
+def migration_heads(versions_dir: Path = MIGRATIONS_DIR) -> set[str]:
+    revisions, parents = read_migrations(versions_dir)
+    return revisions - parents
+
+
+# Проверка, что схема БД накатана миграциями не ниже актуальной версии
+async def check_db_revision(versions_dir: Path = MIGRATIONS_DIR):
+    """Принимает базу на головных ревизиях или впереди них (миграции следующего релиза)."""
+    revisions, parents = read_migrations(versions_dir)
+    heads = revisions - parents
+    async with get_engine().connect() as conn:
+        try:
+            current = set((await conn.execute(text("SELECT version_num FROM alembic_version"))).scalars())
+        except ProgrammingError:
+            # Таблицы alembic_version нет: миграции ни разу не применялись
+            current = set()
+    if not current or current & parents:
+        raise RuntimeError(
+            f"Database schema is at revision {sorted(current) or 'none'}, expected {sorted(heads)}; "
+            "run `python -m src.cli migrate`"
+        )
+    if current - revisions:
+        logger.warning(
+            "Database schema is at revision %s, newer than this release's %s", sorted(current), sorted(heads)
+        )
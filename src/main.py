@@ -1,24 +1,105 @@
-import uvicorn
-from fastapi import FastAPI
+import asyncio
+import logging
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
+from sqlalchemy.exc import DataError, DBAPIError, IntegrityError, TimeoutError as PoolTimeoutError
 
 from src.routers.links import router as links_router
 from src.routers.auth import router as auth_router
-from src.database import engine, init_db
+from src.routers.health import router as health_router
+from src.database import check_db_revision, dispose_engine, get_engine
+from src.middleware import AdaptiveConcurrencyLimiter, LoadSheddingMiddleware
+from src.services.health_service import DatabaseUnavailable, db_health, is_db_unavailable
+from src.config import (
+    WARMUP_READY_TIMEOUT, LIMITER_INITIAL, LIMITER_MIN, LIMITER_MAX, LIMITER_TARGET_LATENCY, GZIP_MINIMUM_SIZE,
+    PROFILING_ENABLED, PROFILE_SAMPLE_RATE, PROFILE_SLOW_MS, PROFILE_DIR, PROFILE_MAX_FILES, LOOP_LAG_THRESHOLD_MS,
+    ADMIN_TOKEN,
+)
+from src.services.warmup_service import CacheWarmer
+from src.services.bloom_service import bloom_maintenance
+from src.services.click_service import click_buffer, click_flusher
+from src.services.rules_service import load_geoip
+from src.profiling import ProfilingMiddleware, LoopLagMonitor, install_db_hooks
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
 
-    await init_db()
+    # Схему накатывает `python -m src.cli migrate`, при старте только сверяем ревизию
+    await check_db_revision()
+    load_geoip()
+    bloom_task = asyncio.create_task(bloom_maintenance())
+    click_task = asyncio.create_task(click_flusher())
+    loop_monitor_task = None
+    if PROFILING_ENABLED:
+        install_db_hooks(get_engine())
+        app.state.loop_monitor = LoopLagMonitor(threshold=LOOP_LAG_THRESHOLD_MS / 1000)
+        loop_monitor_task = asyncio.create_task(app.state.loop_monitor.run())
+
+    # Прогрев кэша: стартуем после загрузки WARMUP_READY_FRACTION горячих ссылок,
+    # остальное догружается в фоне
+    warmer = CacheWarmer()
+    app.state.warmer = warmer
+    warmup_task = asyncio.create_task(warmer.run())
+    try:
+        await asyncio.wait_for(warmer.ready.wait(), WARMUP_READY_TIMEOUT)
+    except asyncio.TimeoutError:
+        logging.warning("Cache warm-up not ready after %ss, starting anyway", WARMUP_READY_TIMEOUT)
     yield
 
-    await engine.dispose()
+    background = (warmup_task, bloom_task, click_task)
+    for task in background:
+        task.cancel()
+    # Дожидаемся отмены: прерванный сброс кликов должен вернуть счётчики в буфер до финального сброса
+    await asyncio.gather(*background, return_exceptions=True)
+    # Клики, накопленные с последнего сброса, не теряем при остановке воркера
+    try:
+        await click_buffer.flush()
+    except Exception:
+        logging.exception("Final click flush failed")
+    if loop_monitor_task:
+        loop_monitor_task.cancel()
+    await dispose_engine()
 
 app = FastAPI(title="Link Shortener API", lifespan=lifespan)
 
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
+app.state.limiter = AdaptiveConcurrencyLimiter(LIMITER_INITIAL, LIMITER_MIN, LIMITER_MAX, LIMITER_TARGET_LATENCY)
+app.add_middleware(LoadSheddingMiddleware, limiter=app.state.limiter)
+
+if PROFILING_ENABLED:
+    app.add_middleware(
+        ProfilingMiddleware, sample_rate=PROFILE_SAMPLE_RATE, slow_ms=PROFILE_SLOW_MS, output_dir=PROFILE_DIR,
+        token=ADMIN_TOKEN, max_files=PROFILE_MAX_FILES,
+    )
+
 app.include_router(links_router, prefix="/links", tags=["links"])
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
+app.include_router(health_router, tags=["health"])
+
+
+@app.exception_handler(DatabaseUnavailable)
+@app.exception_handler(DBAPIError)
+@app.exception_handler(PoolTimeoutError)
+# asyncpg отдаёт отказ в соединении и таймаут подключения как есть, без обёртки DBAPIError
+@app.exception_handler(OSError)
+@app.exception_handler(asyncio.TimeoutError)
+async def database_unavailable_handler(request: Request, exc: Exception):
+    # 503 с Retry-After только для недоступной БД: повтор запроса с теми же данными
+    # после нарушения ограничения ничего не даст
+    if isinstance(exc, IntegrityError):
+        return JSONResponse({"detail": "Conflicts with existing data"}, status_code=409)
+    if isinstance(exc, DataError):
+        return JSONResponse({"detail": "Invalid data for the database"}, status_code=422)
+    if not isinstance(exc, DatabaseUnavailable) and not is_db_unavailable(exc):
+        raise exc
+    db_health.mark_down()
+    return JSONResponse({"detail": "Database unavailable"}, status_code=503, headers={"Retry-After": "5"})
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run("main:app", reload=True, host="127.0.0.1", log_level="debug")
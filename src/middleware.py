@@ -0,0 +1,73 @@
+import time
+
+from fastapi.responses import JSONResponse
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD-лимит параллельности: растёт, пока задержка ниже цели, и умножается на `backoff`
+    не чаще раза за окно при медленных или неудачных запросах."""
+
+    def __init__(self, initial: int, min_limit: int, max_limit: int, target_latency: float, backoff: float = 0.9):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.inflight = 0
+        self.shed = 0
+        self._backoff_at = float("-inf")
+
+    def try_acquire(self) -> bool:
+        if self.inflight >= int(self.limit):
+            self.shed += 1
+            return False
+        self.inflight += 1
+        return True
+
+    def release(self, latency: float, failed: bool = False):
+        # Растим лимит только когда он реально используется
+        saturated = self.inflight * 2 >= self.limit
+        self.inflight -= 1
+        if failed or latency > self.target_latency:
+            now = time.monotonic()
+            if now - latency >= self._backoff_at:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._backoff_at = now
+        elif saturated:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def status(self) -> dict:
+        return {"limit": int(self.limit), "inflight": self.inflight, "shed": self.shed}
+
+
+class LoadSheddingMiddleware:
+    """Отвечает 503, когда достигнут адаптивный лимит параллельности."""
+
+    def __init__(self, app, limiter: AdaptiveConcurrencyLimiter, exempt_paths=("/healthz", "/readyz")):
+        self.app = app
+        self.limiter = limiter
+        self.exempt_paths = set(exempt_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        if not self.limiter.try_acquire():
+            response = JSONResponse({"detail": "Server overloaded"}, status_code=503, headers={"Retry-After": "1"})
+            await response(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.limiter.release(time.perf_counter() - start, failed=status >= 500)
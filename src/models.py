@@ -29,3 +29,35 @@ class Link(Base):
     project = Column(String(50), nullable=True)
 
     user = relationship("User", back_populates="links")
+    # Правила удаляются каскадом в БД, коллекцию при удалении ссылки не подгружаем
+    rules = relationship(
+        "LinkRule", back_populates="link", cascade="all, delete-orphan", passive_deletes=True,
+        order_by="LinkRule.priority",
+    )
+
+
+class LinkRule(Base):
+    __tablename__ = "link_rules"
+
+    id = Column(Integer, primary_key=True)
+    link_id = Column(Integer, ForeignKey("links.id", ondelete="CASCADE"), index=True, nullable=False)
+    priority = Column(Integer, nullable=False, default=0)
+    country = Column(String(2))
+    device = Column(String(10))
+    weight = Column(Integer, nullable=False, default=100)
+    target_url = Column(String(2048), nullable=False)
+
+    link = relationship("Link", back_populates="rules")
+
+
+class LinkImport(Base):
+    """Контрольная точка импорта, пишется в одной транзакции с каждой порцией."""
+    __tablename__ = "link_imports"
+
+    id = Column(String(64), primary_key=True)
+    processed = Column(Integer, nullable=False, default=0)
+    inserted = Column(Integer, nullable=False, default=0)
+    rejected = Column(Integer, nullable=False, default=0)
+    conflicts = Column(Integer, nullable=False, default=0)
+    duplicates = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
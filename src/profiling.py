@@ -0,0 +1,231 @@
+import asyncio
+import cProfile
+import hmac
+import json
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import cache
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+_current_profile = ContextVar("request_profile", default=None)
+_active_profiles = set()
+
+
+class RequestProfile:
+    """Время участков одного запроса; участки могут быть вложенными."""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.finished = None
+        self.spans = []
+        self.loop_lag = 0.0
+        self.status = None
+
+    def add(self, name: str, start: float, duration: float):
+        self.spans.append((name, start - self.started, duration))
+
+    @property
+    def total(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    def breakdown(self) -> dict:
+        totals = {}
+        for name, _, duration in self.spans:
+            totals[name] = totals.get(name, 0.0) + duration
+        return totals
+
+    def as_dict(self) -> dict:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "total_ms": round(self.total * 1000, 3),
+            "max_loop_lag_ms": round(self.loop_lag * 1000, 3),
+            "breakdown_ms": {name: round(value * 1000, 3) for name, value in self.breakdown().items()},
+            "spans": [
+                {"name": name, "offset_ms": round(offset * 1000, 3), "duration_ms": round(duration * 1000, 3)}
+                for name, offset, duration in self.spans
+            ],
+        }
+
+
+@contextmanager
+def span(name: str):
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, start, time.perf_counter() - start)
+
+
+def install_db_hooks(engine):
+    """Записывает каждый запрос к БД через `engine` как участок `db` текущего запроса."""
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context.profile_started = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.add("db", context.profile_started, time.perf_counter() - context.profile_started)
+
+
+class LoopLagMonitor:
+    """Измеряет опоздание пробуждений event loop: задержка означает, что цикл что-то блокировало."""
+
+    def __init__(self, interval: float = 0.05, threshold: float = 0.1):
+        self.interval = interval
+        self.threshold = threshold
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            for profile in _active_profiles:
+                profile.loop_lag = max(profile.loop_lag, lag)
+            if lag > self.threshold:
+                logger.warning("Event loop blocked for %.0f ms", lag * 1000)
+
+
+@cache
+def _pyinstrument():
+    # pyinstrument импортируется при первом профилируемом запросе, а не при старте воркера
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        logger.warning("pyinstrument is not installed, falling back to cProfile")
+        return None
+    return Profiler
+
+
+def _start_profiler():
+    Profiler = _pyinstrument()
+    if Profiler:
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    return profiler
+
+
+def _stop_profiler(profiler):
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+    else:
+        profiler.stop()
+
+
+class ProfilingMiddleware:
+    """Медленные запросы сохраняются как JSON-трассы, с X-Profile или из выборки - ещё и с профилем."""
+
+    # Одновременно пишущихся дампов: при массовом замедлении лишние пропускаем
+    MAX_PENDING_DUMPS = 2
+
+    def __init__(self, app, sample_rate: float, slow_ms: float, output_dir: str, token: str = "",
+                 max_files: int = 200, header: bytes = b"x-profile"):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.output_dir = output_dir
+        # Заголовок X-Profile действует, только если несёт токен администратора
+        self.token = token.encode()
+        self.max_files = max_files
+        self.header = header
+        # Профилировщик может быть активен только один на поток
+        self._profiler_busy = False
+        self._pending_dumps = 0
+        os.makedirs(output_dir, exist_ok=True)
+
+    def _requested(self, headers) -> bool:
+        if not self.token:
+            return False
+        return any(name == self.header and hmac.compare_digest(value, self.token) for name, value in headers)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"])
+        requested = self._requested(scope["headers"])
+        profiler = None
+        if (requested or random.random() < self.sample_rate) and not self._profiler_busy:
+            self._profiler_busy = True
+            profiler = _start_profiler()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                if requested:
+                    timing = ", ".join(f"{name};dur={value * 1000:.2f}" for name, value in profile.breakdown().items())
+                    message["headers"] = list(message.get("headers", [])) + [(b"server-timing", timing.encode())]
+            await send(message)
+
+        token = _current_profile.set(profile)
+        _active_profiles.add(profile)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.finished = time.perf_counter()
+            _active_profiles.discard(profile)
+            _current_profile.reset(token)
+            if profiler is not None:
+                _stop_profiler(profiler)
+                self._profiler_busy = False
+            if (profiler is not None or profile.total * 1000 >= self.slow_ms) \
+                    and self._pending_dumps < self.MAX_PENDING_DUMPS:
+                # Запись на диск и рендер HTML pyinstrument-а не должны держать цикл событий
+                self._pending_dumps += 1
+                try:
+                    await asyncio.to_thread(self._dump, profile, profiler)
+                finally:
+                    self._pending_dumps -= 1
+
+    def _rotate(self):
+        # Имена начинаются с метки времени: самые старые дампы идут первыми
+        names = sorted(os.listdir(self.output_dir))
+        for name in names[:max(0, len(names) - self.max_files)]:
+            os.remove(os.path.join(self.output_dir, name))
+
+    def _dump(self, profile: RequestProfile, profiler):
+        name = f"{int(time.time() * 1000)}-{profile.method}-{profile.path.strip('/').replace('/', '_') or 'root'}"
+        base = os.path.join(self.output_dir, name)
+        try:
+            with open(f"{base}.json", "w") as file:
+                json.dump(profile.as_dict(), file, indent=2)
+            if profiler is None:
+                return
+            if isinstance(profiler, cProfile.Profile):
+                profiler.dump_stats(f"{base}.pstats")
+            else:
+                with open(f"{base}.html", "w") as file:
+                    file.write(profiler.output_html())
+        except OSError:
+            logger.exception("Failed to write profile %s", base)
+        finally:
+            try:
+                self._rotate()
+            except OSError:
+                logger.exception("Failed to rotate profiles in %s", self.output_dir)
@@ -0,0 +1,22 @@
+from collections.abc import Mapping
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+from src.profiling import span
+
+
+def _default(value: Any):
+    # RowMapping и прочие Mapping из Core-запросов сериализуем как обычный dict
+    if isinstance(value, Mapping):
+        return dict(value)
+    raise TypeError
+
+
+class LeanJSONResponse(JSONResponse):
+    """JSON-ответ, сериализующий строки Core сразу в байты через orjson."""
+
+    def render(self, content: Any) -> bytes:
+        with span("serialization"):
+            return orjson.dumps(content, default=_default, option=orjson.OPT_UTC_Z)
@@ -0,0 +1,30 @@
+import asyncio
+
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+
+from src.services.health_service import probe_db, probe_redis
+
+router = APIRouter()
+
+@router.get("/healthz")
+async def liveness():
+    return {"status": "ok"}
+
+@router.get("/readyz")
+async def readiness(request: Request):
+    db, redis = await asyncio.gather(probe_db(), probe_redis())
+    warmer = getattr(request.app.state, "warmer", None)
+    warmup = warmer.status() if warmer else None
+    limiter = getattr(request.app.state, "limiter", None)
+
+    # Без БД редиректы продолжают обслуживаться из кэша (degraded), без обеих зависимостей - не готовы
+    ready = (db["ok"] or redis["ok"]) and (warmup is None or warmup["ready"])
+    status = "ok" if db["ok"] and redis["ok"] else "degraded"
+    body = {
+        "status": status if ready else "unavailable",
+        "checks": {"database": db, "redis": redis},
+        "warmup": warmup,
+        "limiter": limiter.status() if limiter else None,
+    }
+    return JSONResponse(body, status_code=200 if ready else 503)
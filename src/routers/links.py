@@ -1,12 +1,22 @@
+import io
 import time
+from typing import Literal
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, UploadFile
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.schemas.link import LinkCreate, LinkUpdate, Link
+from src.schemas.link import LinkCreate, LinkUpdate, Link, ProjectExtend, ProjectMove, BulkDeleteFilter, BulkResult, \
+    LinkRule, LinkRuleSet
 from src.services.link_service import create_link, get_link, update_link, delete_link, get_link_stats, \
-    search_link_by_url, get_expired_links, get_links_project
-from src.services.auth_service import get_current_user, optional_get_current_user
+    search_link_by_url, get_expired_links, get_links_project, extend_project_links, expire_project_links, \
+    move_project_links, bulk_delete_links
+from src.services.auth_service import get_current_user, optional_get_current_user, require_admin
+from src.services.import_service import import_links
+from src.services.rules_service import get_link_rules, replace_link_rules
 from src.database import get_async_session
+from src.responses import LeanJSONResponse
+from src.config import EXPIRED_ETAG_WINDOW, IMPORT_CHUNK_SIZE
+from src.cache_keys import stats_scope, user_scope
+from src.services.version_service import get_validators, validator_headers, is_not_modified
 
 router = APIRouter()
 
@@ -19,8 +29,9 @@ async def shorten_link(
     return await create_link(db, link, current_user)
 
 @router.get("/get_link/{short_code}", response_model=str)
-async def read_link(short_code: str, db: AsyncSession = Depends(get_async_session)):
-    original_url = await get_link(db, short_code)
+async def read_link(short_code: str, request: Request, db: AsyncSession = Depends(get_async_session)):
+    client_ip = request.client.host if request.client else None
+    original_url = await get_link(db, short_code, client_ip, request.headers.get("user-agent"))
     if original_url is None:
         raise HTTPException(status_code=404, detail="Link not found or expired")
     return original_url
@@ -49,10 +60,20 @@ async def delete_link_endpoint(
     return {"message": "Link deleted"}
 
 @router.get("/stats/{short_code}")
-async def read_link_stats(short_code: str, db: AsyncSession = Depends(get_async_session)):
+async def read_link_stats(
+    short_code: str,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_session)
+):
+    validators = await get_validators(stats_scope(short_code))
+    if validators and is_not_modified(request, *validators):
+        return Response(status_code=304, headers=validator_headers(*validators))
     stats = await get_link_stats(db, short_code)
     if stats is None:
         raise HTTPException(status_code=404, detail="Link not found")
+    if validators:
+        response.headers.update(validator_headers(*validators))
     return stats
 
 @router.get("/search", response_model=Link)
@@ -68,17 +89,108 @@ async def search_link(
 
 @router.get("/expired", response_model=list[Link])
 async def get_expired_links_history(
+    request: Request,
     db: AsyncSession = Depends(get_async_session),
     current_user: dict = Depends(get_current_user)
 ):
+    # Список истекших меняется и без записей, поэтому ETag дополнительно привязан к окну времени
+    window = int(time.time()) // EXPIRED_ETAG_WINDOW
+    validators = await get_validators(user_scope(current_user["id"]), extra=f"expired:{window}", create=True)
+    if validators and is_not_modified(request, *validators):
+        return Response(status_code=304, headers=validator_headers(*validators))
     links = await get_expired_links(db, current_user)
-    return links
+    return LeanJSONResponse(links, headers=validator_headers(*validators) if validators else None)
 
 @router.get("/project/{project}", response_model=list[Link])
 async def get_links_by_project(
     project: str,
+    request: Request,
     db: AsyncSession = Depends(get_async_session),
     current_user: dict = Depends(get_current_user)
 ):
+    validators = await get_validators(user_scope(current_user["id"]), extra=f"project:{project}", create=True)
+    if validators and is_not_modified(request, *validators):
+        return Response(status_code=304, headers=validator_headers(*validators))
     links = await get_links_project(db, project, current_user)
-    return links
\ No newline at end of file
+    return LeanJSONResponse(links, headers=validator_headers(*validators) if validators else None)
+
+@router.post("/project/{project}/extend", response_model=BulkResult)
+async def extend_project(
+    project: str,
+    data: ProjectExtend,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: dict = Depends(get_current_user)
+):
+    if (data.expires_at is None) == (data.extend_by is None):
+        raise HTTPException(status_code=400, detail="Provide exactly one of expires_at or extend_by")
+    return {"affected": await extend_project_links(db, project, data, current_user)}
+
+@router.post("/project/{project}/expire", response_model=BulkResult)
+async def expire_project(
+    project: str,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: dict = Depends(get_current_user)
+):
+    return {"affected": await expire_project_links(db, project, current_user)}
+
+@router.post("/project/{project}/move", response_model=BulkResult)
+async def move_project(
+    project: str,
+    data: ProjectMove,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: dict = Depends(get_current_user)
+):
+    return {"affected": await move_project_links(db, project, data.target_project, current_user)}
+
+@router.post("/bulk_delete", response_model=BulkResult)
+async def bulk_delete(
+    filters: BulkDeleteFilter,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: dict = Depends(get_current_user)
+):
+    if filters.project is None and not filters.expired_only and filters.created_before is None:
+        raise HTTPException(status_code=400, detail="At least one filter is required")
+    return {"affected": await bulk_delete_links(db, filters, current_user)}
+
+@router.post("/import", dependencies=[Depends(require_admin)])
+async def import_links_endpoint(
+    file: UploadFile,
+    format: Literal["csv", "ndjson"] = Query("csv"),
+    offset: int = Query(0, ge=0, description="Records to skip, e.g. 'processed' from an interrupted import"),
+    user_id: int | None = Query(None, description="Owner of the imported links"),
+    import_id: str | None = Query(
+        None, max_length=64, pattern=r"^[\w.-]+$",
+        description="Resumable import: progress is committed with each chunk, resend the file with the same id",
+    ),
+):
+    stream = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    try:
+        report = await import_links(
+            stream, format, user_id=user_id, offset=offset, chunk_size=IMPORT_CHUNK_SIZE, import_id=import_id
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return report.as_dict()
+
+@router.get("/{short_code}/rules", response_model=list[LinkRule])
+async def read_link_rules(
+    short_code: str,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: dict = Depends(get_current_user)
+):
+    rules = await get_link_rules(db, short_code, current_user)
+    if rules is None:
+        raise HTTPException(status_code=404, detail="Link not found or unauthorized")
+    return rules
+
+@router.put("/{short_code}/rules", response_model=list[LinkRule])
+async def replace_rules(
+    short_code: str,
+    data: LinkRuleSet,
+    db: AsyncSession = Depends(get_async_session),
+    current_user: dict = Depends(get_current_user)
+):
+    rules = await replace_link_rules(db, short_code, data.rules, current_user)
+    if rules is None:
+        raise HTTPException(status_code=404, detail="Link not found or unauthorized")
+    return rules
@@ -1,7 +1,9 @@
 from fastapi import Query
-from pydantic import BaseModel
-from datetime import datetime
-from typing import Optional
+from pydantic import BaseModel, Field
+from datetime import datetime, timedelta
+from typing import Literal, Optional
+
+from src.config import LINK_RULES_MAX
 
 class LinkBase(BaseModel):
     original_url: str
@@ -42,4 +44,35 @@ class LinkSchema(BaseModel):
         from_attributes = True  # Для совместимости с ORM, например, SQLAlchemy
         json_encoders = {
             datetime: lambda v: v.isoformat() if v else None
-        }
\ No newline at end of file
+        }
+
+class ProjectExtend(BaseModel):
+    expires_at: Optional[datetime] = None
+    extend_by: Optional[timedelta] = None
+
+class ProjectMove(BaseModel):
+    target_project: str = Field(max_length=50)
+
+class BulkDeleteFilter(BaseModel):
+    project: Optional[str] = None
+    expired_only: bool = False
+    created_before: Optional[datetime] = None
+
+class BulkResult(BaseModel):
+    affected: int
+
+class LinkRuleCreate(BaseModel):
+    priority: int = 0
+    country: Optional[str] = Field(default=None, pattern="^[A-Z]{2}$")
+    device: Optional[Literal["mobile", "tablet", "desktop", "bot"]] = None
+    weight: int = Field(default=100, ge=1)
+    target_url: str = Field(max_length=2048)
+
+class LinkRule(LinkRuleCreate):
+    id: int
+
+    class Config:
+        from_attributes = True
+
+class LinkRuleSet(BaseModel):
+    rules: list[LinkRuleCreate] = Field(default_factory=list, max_length=LINK_RULES_MAX)
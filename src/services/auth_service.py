@@ -1,15 +1,17 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from typing import Optional
-from fastapi import Security
+from fastapi import Security, Header
+import hmac
 
+from src.config import ADMIN_TOKEN
 from src.database import get_async_session
 from src.models import User
 from src.schemas.auth import UserCreate, UserLogin
 from src.utils import hash_password, verify_password
+from src.profiling import span
 from fastapi import HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer, HTTPBearer
-import jwt
 from datetime import datetime, timedelta
 
 SECRET_KEY = "your_secret_key"
@@ -38,6 +40,8 @@ async def authenticate_user(db: AsyncSession, user: UserLogin):
     return db_user
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
+    import jwt
+
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -48,23 +52,23 @@ def create_access_token(data: dict, expires_delta: timedelta = None):
     return encoded_jwt
 
 
-class JWTError:
-    pass
-
-
 async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_session)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+    # Span охватывает всю зависимость: импорт PyJWT, проверку подписи и запрос пользователя
+    with span("dependencies"):
+        import jwt
+
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            username: str = payload.get("sub")
+            if username is None:
+                raise HTTPException(status_code=401, detail="Invalid token")
+            user = await db.execute(select(User).filter(User.username == username))
+            user = user.scalar_one_or_none()
+            if user is None:
+                raise HTTPException(status_code=401, detail="User not found")
+            return {"id": user.id, "username": user.username}  # Убедитесь, что id возвращается
+        except jwt.PyJWTError:
             raise HTTPException(status_code=401, detail="Invalid token")
-        user = await db.execute(select(User).filter(User.username == username))
-        user = user.scalar_one_or_none()
-        if user is None:
-            raise HTTPException(status_code=401, detail="User not found")
-        return {"id": user.id, "username": user.username}  # Убедитесь, что id возвращается
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
 
 
 async def optional_get_current_user(
@@ -75,17 +79,28 @@ async def optional_get_current_user(
     if not token:
         return None  # Позволяет анонимным пользователям
 
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if not username:
-            return None
+    with span("dependencies"):
+        # PyJWT импортируется при первом запросе с токеном, а не при старте воркера
+        import jwt
+
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            username: str = payload.get("sub")
+            if not username:
+                return None
 
-        result = await db.execute(select(User).filter(User.username == username))
-        user = result.scalar_one_or_none()
-        if not user:
+            result = await db.execute(select(User).filter(User.username == username))
+            user = result.scalar_one_or_none()
+            if not user:
+                return None
+
+            return {"id": user.id, "username": user.username}
+        except jwt.PyJWTError:
             return None
 
-        return {"id": user.id, "username": user.username}
-    except jwt.PyJWTError:
-        return None
\ No newline at end of file
+
+async def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
\ No newline at end of file
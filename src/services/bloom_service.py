@@ -0,0 +1,238 @@
+import asyncio
+import hashlib
+import logging
+import math
+import time
+import uuid
+
+from sqlalchemy.future import select
+
+from src.cache import cache_execute, PIPELINE_CHUNK
+from src.config import BLOOM_CAPACITY, BLOOM_ERROR_RATE, BLOOM_REBUILD_INTERVAL, BLOOM_SCAN_BATCH, BLOOM_PENDING_MAX
+from src.database import get_session_maker
+from src.models import Link
+
+logger = logging.getLogger(__name__)
+
+BLOOM_CHECK_INTERVAL = 60
+# Пока у воркера есть недописанные коды, досылаем их чаще
+BLOOM_RETRY_INTERVAL = 1
+BLOOM_LOCK_TTL = 60
+
+
+def bloom_parameters(capacity: int, error_rate: float) -> tuple[int, int]:
+    """Оптимальные число бит m и число хэшей k для ёмкости и доли ложных срабатываний."""
+    bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+    hashes = max(1, round(bits / capacity * math.log(2)))
+    return bits, hashes
+
+
+def bloom_positions(item: str, bits: int, hashes: int) -> list[int]:
+    # Двойное хеширование (Kirsch-Mitzenmacher) из одного blake2b
+    digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+    return [(h1 + i * h2) % bits for i in range(hashes)]
+
+
+class RedisBloomFilter:
+    """Фильтр Блума в битовой карте Redis, общей для всех воркеров; отсутствие ключа значит
+    "неизвестно", а флаг dirty запрещает доверять отрицательному ответу до перестроения."""
+
+    def __init__(self, name: str, capacity: int, error_rate: float, max_pending: int = BLOOM_PENDING_MAX):
+        self.bits, self.hashes = bloom_parameters(capacity, error_rate)
+        self.key = f"bloom:{name}:{self.bits}:{self.hashes}"
+        self.built_at_key = f"{self.key}:built_at"
+        self.building_key = f"{self.key}:building"
+        self.lock_key = f"{self.key}:lock"
+        self.dirty_key = f"{self.key}:dirty"
+        # Флаг, который забрала идущая пересборка: снимается только вместе с подменой битмапа
+        self.dirty_rebuild_key = f"{self.key}:dirty:rebuild"
+        self.max_pending = max_pending
+        self._pending = set()
+        # Флаг ещё не удалось записать в Redis: этот воркер сам не верит отрицательным ответам
+        self._dirty_unsent = False
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._pending) or self._dirty_unsent
+
+    async def might_contain(self, item: str) -> bool | None:
+        """False - точно не добавлялся; True - вероятно добавлялся; None - фильтр недоступен."""
+        await self.flush()
+        if item in self._pending:
+            return True
+        positions = bloom_positions(item, self.bits, self.hashes)
+
+        async def operation(client):
+            pipe = client.pipeline(transaction=False)
+            pipe.exists(self.key)
+            pipe.exists(self.dirty_key, self.dirty_rebuild_key)
+            for position in positions:
+                pipe.getbit(self.key, position)
+            return await pipe.execute()
+
+        result = await cache_execute(operation)
+        if not result or not result[0]:
+            return None
+        if all(result[2:]):
+            return True
+        # В фильтре может не хватать кодов, которые какой-то воркер не смог дописать
+        return None if result[1] or self._dirty_unsent else False
+
+    async def add(self, items: list[str]):
+        self._pending.update(items)
+        await self.flush()
+
+    async def flush(self):
+        if self._dirty_unsent:
+            await self._mark_dirty()
+        if not self._pending:
+            return
+        items = list(self._pending)
+
+        async def operation(client):
+            pipe = client.pipeline(transaction=False)
+            pipe.exists(self.key)
+            pipe.get(self.building_key)
+            return await pipe.execute()
+
+        result = await cache_execute(operation)
+        try:
+            if result is None:
+                raise ConnectionError("Redis unavailable during bloom filter add")
+            exists, building = result
+            targets = ([self.key] if exists else []) + ([building.decode()] if building else [])
+            for target in targets:
+                await self._set_bits(target, items)
+        except ConnectionError:
+            await self._mark_dirty()
+            if len(self._pending) > self.max_pending:
+                # Столько кодов в памяти не держим: флаг уже не даёт верить отрицательным
+                # ответам, а недостающие коды вернёт пересборка из БД
+                logger.warning("Dropping %d pending bloom filter codes until rebuild", len(self._pending))
+                self._pending.clear()
+            return
+        self._pending.difference_update(items)
+
+    async def _mark_dirty(self):
+        self._dirty_unsent = await cache_execute(lambda client: client.set(self.dirty_key, 1)) is None
+
+    async def is_dirty(self) -> bool:
+        return bool(await cache_execute(lambda client: client.exists(self.dirty_key, self.dirty_rebuild_key)))
+
+    async def _renew_lock(self, token: str, tmp_key: str):
+        # Замок короткий и продлевается после каждой пачки: если воркер убит, следующий
+        # сможет пересобрать фильтр через BLOOM_LOCK_TTL, а не через часы. Недостроенный
+        # битмап живёт столько же
+        async def operation(client):
+            pipe = client.pipeline(transaction=False)
+            pipe.get(self.lock_key)
+            pipe.expire(self.lock_key, BLOOM_LOCK_TTL)
+            pipe.expire(self.building_key, BLOOM_LOCK_TTL)
+            pipe.expire(tmp_key, BLOOM_LOCK_TTL)
+            return await pipe.execute()
+
+        result = await cache_execute(operation)
+        if result is None:
+            raise ConnectionError("Redis unavailable during bloom filter rebuild")
+        if result[0] is None or result[0].decode() != token:
+            raise RuntimeError("Bloom filter rebuild lock lost to another worker")
+
+    async def age(self) -> float | None:
+        """Секунды с последнего завершённого построения, None если фильтра нет."""
+        async def operation(client):
+            pipe = client.pipeline(transaction=False)
+            pipe.exists(self.key)
+            pipe.get(self.built_at_key)
+            return await pipe.execute()
+
+        result = await cache_execute(operation)
+        if not result or not result[0] or not result[1]:
+            return None
+        return time.time() - float(result[1])
+
+    async def _set_bits(self, key: str, items):
+        # Пайплайны не длиннее PIPELINE_CHUNK команд, чтобы каждый укладывался в REDIS_TIMEOUT
+        step = max(1, PIPELINE_CHUNK // self.hashes)
+        for offset in range(0, len(items), step):
+            chunk = items[offset:offset + step]
+
+            async def operation(client):
+                pipe = client.pipeline(transaction=False)
+                for item in chunk:
+                    for position in bloom_positions(item, self.bits, self.hashes):
+                        pipe.setbit(key, position, 1)
+                return await pipe.execute()
+
+            if await cache_execute(operation) is None:
+                raise ConnectionError("Redis unavailable during bloom filter rebuild")
+
+    async def rebuild(self, session_maker=None) -> bool:
+        """Перестраивает фильтр потоковым обходом всех коротких кодов; одновременно только один воркер."""
+        session_maker = session_maker or get_session_maker()
+        token = uuid.uuid4().hex
+        if not await cache_execute(lambda client: client.set(self.lock_key, token, nx=True, ex=BLOOM_LOCK_TTL)):
+            return False
+
+        tmp_key = f"{self.key}:tmp:{token}"
+        start = time.perf_counter()
+        count = 0
+        owned = True
+        try:
+            # Сразу выделяем весь битмап, чтобы RENAME работал и для пустой таблицы
+            await cache_execute(lambda client: client.setbit(tmp_key, self.bits - 1, 0))
+            await cache_execute(lambda client: client.set(self.building_key, tmp_key, ex=BLOOM_LOCK_TTL))
+            await self._renew_lock(token, tmp_key)
+            # Коды, из-за которых поднят флаг, уже закоммичены и попадут в снимок ниже. Флаг
+            # переносим, а не удаляем: если пересборка оборвётся, он останется в силе; флаг,
+            # поднятый после этой точки, переживёт пересборку
+            if await cache_execute(lambda client: client.exists(self.dirty_key)):
+                await cache_execute(lambda client: client.rename(self.dirty_key, self.dirty_rebuild_key))
+            async with session_maker() as session:
+                result = await session.stream_scalars(
+                    select(Link.short_code).execution_options(yield_per=BLOOM_SCAN_BATCH)
+                )
+                async for codes in result.partitions(BLOOM_SCAN_BATCH):
+                    await self._set_bits(tmp_key, codes)
+                    count += len(codes)
+                    await self._renew_lock(token, tmp_key)
+
+            async def swap(client):
+                pipe = client.pipeline(transaction=False)
+                pipe.rename(tmp_key, self.key)
+                pipe.persist(self.key)
+                pipe.set(self.built_at_key, time.time())
+                pipe.delete(self.building_key, self.dirty_rebuild_key)
+                return await pipe.execute()
+
+            await self._renew_lock(token, tmp_key)
+            if await cache_execute(swap) is None:
+                raise ConnectionError("Redis unavailable during bloom filter swap")
+            logger.info("Bloom filter rebuilt: %d codes in %.1fs", count, time.perf_counter() - start)
+            return True
+        except RuntimeError:
+            owned = False
+            raise
+        finally:
+            keys = (tmp_key, self.building_key, self.lock_key) if owned else (tmp_key,)
+            await cache_execute(lambda client: client.delete(*keys))
+
+
+link_filter = RedisBloomFilter("links", BLOOM_CAPACITY, BLOOM_ERROR_RATE)
+
+
+async def bloom_maintenance():
+    """Фоновый цикл: досылает отложенные коды и перестраивает фильтр, если он устарел или отсутствует."""
+    while True:
+        try:
+            await link_filter.flush()
+            if not link_filter.pending:
+                age = await link_filter.age()
+                if age is None or age > BLOOM_REBUILD_INTERVAL or await link_filter.is_dirty():
+                    await link_filter.rebuild()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Bloom filter rebuild failed")
+        await asyncio.sleep(BLOOM_RETRY_INTERVAL if link_filter.pending else BLOOM_CHECK_INTERVAL)
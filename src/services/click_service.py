@@ -0,0 +1,88 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from sqlalchemy import bindparam, case, func, select, update
+
+from src.cache_keys import stats_scope, user_scope
+from src.config import CLICK_FLUSH_INTERVAL
+from src.database import get_session_maker
+from src.models import Link
+from src.services.version_service import bump_versions
+
+logger = logging.getLogger(__name__)
+
+links = Link.__table__
+
+# Один executemany на все ссылки, по которым были переходы с прошлого сброса
+FLUSH_CLICKS = (
+    update(links)
+    .where(links.c.short_code == bindparam("code"))
+    .values(
+        clicks=func.coalesce(links.c.clicks, 0) + bindparam("count"),
+        # Сбросы разных воркеров приходят в любом порядке: last_used только растёт.
+        # CASE вместо GREATEST, чтобы выражение работало и в SQLite
+        last_used=case(
+            (links.c.last_used > bindparam("used_at"), links.c.last_used), else_=bindparam("used_at")
+        ),
+    )
+)
+
+
+class ClickBuffer:
+    """Счётчики кликов воркера, периодически записываемые в БД одним пакетом."""
+
+    def __init__(self):
+        self._counts = {}
+        self._used_at = {}
+
+    def record(self, short_code: str):
+        self._counts[short_code] = self._counts.get(short_code, 0) + 1
+        self._used_at[short_code] = datetime.now(timezone.utc)
+
+    def _restore(self, counts: dict, used_at: dict):
+        for short_code, count in counts.items():
+            self._counts[short_code] = self._counts.get(short_code, 0) + count
+            self._used_at[short_code] = max(used_at[short_code], self._used_at.get(short_code, used_at[short_code]))
+
+    async def flush(self, session_maker=None) -> int:
+        """Записывает накопленные клики; возвращает число обновлённых ссылок."""
+        if not self._counts:
+            return 0
+        counts, used_at = self._counts, self._used_at
+        self._counts, self._used_at = {}, {}
+        params = [
+            {"code": short_code, "count": count, "used_at": used_at[short_code]}
+            for short_code, count in counts.items()
+        ]
+        try:
+            async with (session_maker or get_session_maker())() as session:
+                await session.execute(FLUSH_CLICKS, params)
+                owners = (await session.execute(
+                    select(links.c.user_id).distinct()
+                    .where(links.c.short_code.in_(list(counts)), links.c.user_id.is_not(None))
+                )).scalars().all()
+                await session.commit()
+        except BaseException:
+            self._restore(counts, used_at)
+            raise
+        # Клики видны в статистике и в списках ссылок владельцев: их ETag-и больше не актуальны
+        await bump_versions(
+            *(stats_scope(short_code) for short_code in counts), *(user_scope(user_id) for user_id in owners)
+        )
+        return len(params)
+
+
+click_buffer = ClickBuffer()
+
+
+async def click_flusher():
+    """Фоновый цикл записи накопленных кликов каждые CLICK_FLUSH_INTERVAL секунд."""
+    while True:
+        await asyncio.sleep(CLICK_FLUSH_INTERVAL)
+        try:
+            await click_buffer.flush()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Click flush failed, will retry")
@@ -0,0 +1,78 @@
+import asyncio
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError, TimeoutError as PoolTimeoutError
+
+from src.cache import get_redis, breaker
+from src.config import DB_DOWN_COOLDOWN, HEALTH_PROBE_TIMEOUT
+from src.database import get_engine
+
+
+class DatabaseUnavailable(Exception):
+    pass
+
+
+# Ошибки связи с БД; нарушения ограничений и неверные данные сюда не относятся
+DB_UNAVAILABLE_ERRORS = (OperationalError, InterfaceError, PoolTimeoutError, OSError, asyncio.TimeoutError)
+
+
+def is_db_unavailable(exc: BaseException) -> bool:
+    if isinstance(exc, DBAPIError) and exc.connection_invalidated:
+        return True
+    return isinstance(exc, DB_UNAVAILABLE_ERRORS)
+
+
+class DependencyHealth:
+    """Помнит недавний отказ зависимости, чтобы отвечать сразу, а не ждать таймаутов."""
+
+    def __init__(self, cooldown: float):
+        self.cooldown = cooldown
+        self.failed_at = None
+
+    def mark_down(self):
+        self.failed_at = time.monotonic()
+
+    def mark_up(self):
+        self.failed_at = None
+
+    def is_down(self) -> bool:
+        return self.failed_at is not None and time.monotonic() - self.failed_at < self.cooldown
+
+
+db_health = DependencyHealth(DB_DOWN_COOLDOWN)
+
+
+async def _probe(check) -> dict:
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(check(), HEALTH_PROBE_TIMEOUT)
+        error = None
+    except Exception as exc:
+        error = repr(exc)
+    return {"ok": error is None, "latency_ms": round((time.perf_counter() - start) * 1000, 2), "error": error}
+
+
+async def _check_db():
+    async with get_engine().connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+async def _check_redis():
+    async with get_redis() as client:
+        await client.ping()
+
+
+async def probe_db() -> dict:
+    result = await _probe(_check_db)
+    if result["ok"]:
+        db_health.mark_up()
+    else:
+        db_health.mark_down()
+    return result
+
+
+async def probe_redis() -> dict:
+    result = await _probe(_check_redis)
+    result["circuit"] = breaker.state
+    return result
@@ -0,0 +1,232 @@
+import asyncio
+import csv
+import hashlib
+import json
+import logging
+import string
+import time
+from datetime import timezone
+from itertools import islice
+
+from pydantic import ValidationError
+
+from src.database import get_engine
+from src.schemas.link import LinkCreate
+from src.services.bloom_service import link_filter
+from src.cache_keys import user_scope
+from src.services.version_service import bump_versions
+
+logger = logging.getLogger(__name__)
+
+STAGING_TABLE = "links_import_staging"
+STAGING_COLUMNS = ("short_code", "original_url", "expires_at", "project", "user_id")
+CODE_RETRIES = 5
+CODE_ALPHABET = string.ascii_letters + string.digits
+CODE_LENGTH = 6
+
+CREATE_STAGING = f"""
+CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+    short_code varchar(10) NOT NULL,
+    original_url varchar(2048) NOT NULL,
+    expires_at timestamptz,
+    project varchar(50),
+    user_id integer
+) ON COMMIT DELETE ROWS
+"""
+
+MERGE_STAGING = f"""
+INSERT INTO links (short_code, original_url, created_at, expires_at, clicks, user_id, is_active, project)
+SELECT short_code, original_url, now(), expires_at, 0, user_id, true, project
+FROM {STAGING_TABLE}
+ON CONFLICT (short_code) DO NOTHING
+RETURNING short_code
+"""
+
+# Коды из staging, под которыми в links уже лежит та же ссылка того же владельца
+MATCH_EXISTING = f"""
+SELECT s.short_code
+FROM {STAGING_TABLE} s
+JOIN links l ON l.short_code = s.short_code
+    AND l.original_url = s.original_url
+    AND l.user_id IS NOT DISTINCT FROM s.user_id
+"""
+
+SAVE_CHECKPOINT = """
+INSERT INTO link_imports (id, processed, inserted, rejected, conflicts, duplicates, updated_at)
+VALUES ($1, $2, $3, $4, $5, $6, now())
+ON CONFLICT (id) DO UPDATE SET
+    processed = EXCLUDED.processed,
+    inserted = link_imports.inserted + EXCLUDED.inserted,
+    rejected = link_imports.rejected + EXCLUDED.rejected,
+    conflicts = link_imports.conflicts + EXCLUDED.conflicts,
+    duplicates = link_imports.duplicates + EXCLUDED.duplicates,
+    updated_at = now()
+"""
+
+
+class ImportReport:
+    def __init__(self, offset: int = 0, import_id: str | None = None):
+        self.import_id = import_id
+        self.processed = offset
+        self.inserted = 0
+        self.rejected = 0
+        self.conflicts = 0
+        self.duplicates = 0
+        self.started = time.perf_counter()
+
+    @property
+    def rows_per_sec(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return self.inserted / elapsed if elapsed else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "import_id": self.import_id,
+            "processed": self.processed,
+            "inserted": self.inserted,
+            "rejected": self.rejected,
+            "conflicts": self.conflicts,
+            "duplicates": self.duplicates,
+            "rows_per_sec": round(self.rows_per_sec, 1),
+        }
+
+
+def read_records(stream, fmt: str):
+    """Лениво читает записи из CSV (с заголовком) или NDJSON."""
+    if fmt == "csv":
+        for record in csv.DictReader(stream):
+            # Пустые ячейки CSV - это отсутствующие значения
+            yield {key: value or None for key, value in record.items()}
+    elif fmt == "ndjson":
+        for line in stream:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    yield None
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+
+def import_code(user_id: int | None, index: int, original_url: str, attempt: int = 0) -> str:
+    """Детерминированный код для записи без него: повторный импорт даёт те же коды."""
+    digest = hashlib.blake2b(f"{user_id}:{index}:{attempt}:{original_url}".encode(), digest_size=8).digest()
+    value = int.from_bytes(digest, "big")
+    code = []
+    for _ in range(CODE_LENGTH):
+        value, remainder = divmod(value, len(CODE_ALPHABET))
+        code.append(CODE_ALPHABET[remainder])
+    return "".join(code)
+
+
+def validate_chunk(records, user_id: int | None, start: int = 0) -> tuple[list[tuple], list[int | None], int]:
+    """Проверяет записи, начиная с `start`; возвращает строки для staging и отклонённые записи."""
+    rows, generated, rejected = [], [], 0
+    for index, record in enumerate(records, start):
+        try:
+            link = LinkCreate.model_validate(record)
+        except ValidationError:
+            rejected += 1
+            continue
+        if len(link.original_url) > 2048 or (link.short_code and len(link.short_code) > 10) \
+                or (link.project and len(link.project) > 50):
+            rejected += 1
+            continue
+        expires_at = link.expires_at
+        if expires_at and expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        short_code = link.short_code or import_code(user_id, index, link.original_url)
+        rows.append((short_code, link.original_url, expires_at, link.project, user_id))
+        generated.append(None if link.short_code else index)
+    return rows, generated, rejected
+
+
+def read_chunk(records, chunk_size: int, user_id: int | None, start: int):
+    """Читает и проверяет следующую порцию; блокирующая, выполняется в потоке."""
+    chunk = list(islice(records, chunk_size))
+    return len(chunk), *validate_chunk(chunk, user_id, start)
+
+
+async def load_chunk(conn, rows: list[tuple], generated: list[int | None]) -> tuple[list[str], int, int]:
+    """COPY порции в staging и слияние в links внутри транзакции вместе с контрольной точкой."""
+    inserted, duplicates = [], 0
+    await conn.execute(CREATE_STAGING)
+    pending = list(zip(rows, generated))
+    for attempt in range(1, CODE_RETRIES + 1):
+        await conn.copy_records_to_table(STAGING_TABLE, records=[row for row, _ in pending], columns=STAGING_COLUMNS)
+        merged = {record["short_code"] for record in await conn.fetch(MERGE_STAGING)}
+        existing = {record["short_code"] for record in await conn.fetch(MATCH_EXISTING)} - merged
+        await conn.execute(f"DELETE FROM {STAGING_TABLE}")
+        inserted += merged
+        duplicates += len(existing)
+        pending = [
+            ((import_code(row[4], index, row[1], attempt),) + row[1:], index)
+            for row, index in pending
+            if row[0] not in merged and row[0] not in existing and index is not None
+        ]
+        if not pending:
+            break
+    return inserted, len(rows) - len(inserted) - duplicates, duplicates
+
+
+async def save_checkpoint(conn, import_id: str, processed: int, inserted: int, rejected: int, conflicts: int,
+                          duplicates: int):
+    await conn.execute(SAVE_CHECKPOINT, import_id, processed, inserted, rejected, conflicts, duplicates)
+
+
+async def read_checkpoint(conn, import_id: str | None) -> int:
+    if not import_id:
+        return 0
+    return await conn.fetchval("SELECT processed FROM link_imports WHERE id = $1", import_id) or 0
+
+
+async def import_links(
+    stream,
+    fmt: str,
+    user_id: int | None = None,
+    offset: int = 0,
+    chunk_size: int = 5000,
+    import_id: str | None = None,
+) -> ImportReport:
+    """Потоково импортирует записи порциями с постоянной памятью; с `import_id` продолжает с контрольной точки."""
+    if fmt not in ("csv", "ndjson"):
+        raise ValueError(f"Unsupported import format: {fmt}")
+    records = read_records(stream, fmt)
+
+    async with get_engine().connect() as sa_conn:
+        raw = await sa_conn.get_raw_connection()
+        conn = raw.driver_connection
+        if user_id is not None and not await conn.fetchval("SELECT 1 FROM users WHERE id = $1", user_id):
+            raise ValueError(f"User {user_id} does not exist")
+        offset = max(offset, await read_checkpoint(conn, import_id))
+        if offset:
+            await asyncio.to_thread(lambda: sum(1 for _ in islice(records, offset)))
+        report = ImportReport(offset, import_id)
+
+        while True:
+            count, rows, generated, rejected = await asyncio.to_thread(
+                read_chunk, records, chunk_size, user_id, report.processed
+            )
+            if not count:
+                break
+            inserted, conflicts, duplicates = [], 0, 0
+            async with conn.transaction():
+                if rows:
+                    inserted, conflicts, duplicates = await load_chunk(conn, rows, generated)
+                if import_id:
+                    await save_checkpoint(
+                        conn, import_id, report.processed + count, len(inserted), rejected, conflicts, duplicates
+                    )
+            await link_filter.add(inserted)
+            report.processed += count
+            report.inserted += len(inserted)
+            report.rejected += rejected
+            report.conflicts += conflicts
+            report.duplicates += duplicates
+            logger.info(
+                "Import: %d processed, %d inserted, %.0f rows/sec",
+                report.processed, report.inserted, report.rows_per_sec,
+            )
+
+    await bump_versions(user_scope(user_id))
+    return report
@@ -1,13 +1,35 @@
 import logging
 from urllib.parse import unquote
-from sqlalchemy import delete
+from sqlalchemy import delete, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 from sqlalchemy.future import select
 from datetime import datetime, timezone
 from src.models import Link
-from src.schemas.link import LinkCreate, LinkUpdate, LinkSchema
+from src.schemas.link import LinkCreate, LinkUpdate, LinkSchema, ProjectExtend, BulkDeleteFilter
 from src.utils import generate_short_code
-from src.cache import cache_set, cache_get, cache_delete
+from src.cache import cache_set, cache_get, cache_delete, cache_delete_many, cache_get_versioned, \
+    cache_set_versioned, invalidate_tags, VERSION_FIELD
+from src.cache_keys import link_key, link_scope, stats_key, stats_scope, search_key, search_scope, url_tag, user_scope
+from src.services.health_service import DatabaseUnavailable, db_health, is_db_unavailable
+from src.services.version_service import bump_versions, get_version
+from src.services.bloom_service import link_filter
+from src.services.rules_service import choose_target, compile_rules
+from src.services.click_service import click_buffer
+from src.profiling import span
+
+# Колонки, которые отдают списочные эндпоинты (поля схемы src.schemas.link.Link)
+LINK_COLUMNS = (
+    Link.id,
+    Link.short_code,
+    Link.original_url,
+    Link.created_at,
+    Link.expires_at,
+    Link.clicks,
+    Link.last_used,
+    Link.is_active,
+    Link.project,
+)
 
 async def create_link(db: AsyncSession, link: LinkCreate, current_user: dict | None):
     existing_link_query = select(Link).filter(
@@ -24,7 +46,7 @@ async def create_link(db: AsyncSession, link: LinkCreate, current_user: dict | N
         return existing_link
 
     short_code = link.short_code or generate_short_code()
-    while (await db.execute(select(Link).filter(Link.short_code == short_code))).scalar():
+    while await short_code_taken(db, short_code):
         short_code = generate_short_code()
     new_link = Link(
         original_url=link.original_url,
@@ -40,51 +62,93 @@ async def create_link(db: AsyncSession, link: LinkCreate, current_user: dict | N
     await db.commit()
     await db.refresh(new_link)
 
-    link_data = LinkSchema.model_validate(new_link).model_dump(by_alias=True, mode="json")
-    await cache_set(f"link:{new_link.short_code}", link_data)
-    await cache_set(f"search:{new_link.original_url}:{current_user['id'] if current_user else 'anon'}", link_data)
+    user_id = current_user["id"] if current_user else None
+    # Писатель только поднимает версии и снимает записи: собирают их читатели по версии,
+    # прочитанной до SELECT. Запись собственных данных гонялась бы с другим писателем
+    await bump_versions(
+        link_scope(short_code), stats_scope(short_code), user_scope(new_link.user_id), search_scope(user_id)
+    )
+    await invalidate_tags(url_tag(new_link.original_url))
+    await cache_delete(link_key(short_code))
+    await link_filter.add([short_code])
 
     return new_link
 
-async def get_link(db: AsyncSession, short_code: str):
-    cache_key = f"link:{short_code}"
-    cached = await cache_get(cache_key)
+async def short_code_taken(db: AsyncSession, short_code: str) -> bool:
+    # Bloom-фильтр точно знает об отсутствии кода, в БД идём только при возможном совпадении
+    if await link_filter.might_contain(short_code) is False:
+        return False
+    return (await db.execute(select(Link.id).filter(Link.short_code == short_code))).scalar() is not None
+
+def _is_live(link_data: dict) -> bool:
+    if not link_data["is_active"]:
+        return False
+    expires_at = link_data.get("expires_at")
+    return not expires_at or datetime.fromisoformat(expires_at) > datetime.now(timezone.utc)
+
+async def get_link(db: AsyncSession, short_code: str, client_ip: str | None = None, user_agent: str | None = None):
+    cache_key = link_key(short_code)
+    cached = await cache_get_versioned(cache_key, link_scope(short_code))
     if cached:
-        link = LinkSchema.model_validate(cached)
-        if link.is_active and (not link.expires_at or link.expires_at > datetime.now(timezone.utc)):
-            link.clicks += 1
-            link.last_used = datetime.utcnow()
-            await cache_set(cache_key, link.model_dump(by_alias=True, mode="json"))
-            return link.original_url
-        else:
+        if not _is_live(cached):
             await cache_delete(cache_key)
             return None
-    result = await db.execute(select(Link).filter(Link.short_code == short_code, Link.is_active == True))
-    link = result.scalar_one_or_none()
-    if link and (not link.expires_at or link.expires_at > datetime.now(timezone.utc)):
-        link.clicks += 1
-        link.last_used = datetime.utcnow()
-        await db.commit()
+        # Клик копится в буфере воркера: попадание в кэш ничего не пишет ни в БД, ни в кэш
+        click_buffer.record(short_code)
+        # Скомпилированные правила лежат в записи кэша рядом с полями схемы и не гоняются через pydantic
+        return choose_target(cached.get("targeting"), cached["original_url"], client_ip, user_agent)
+    if await link_filter.might_contain(short_code) is False:
+        return None
+    # Degraded mode: пока БД недоступна, обслуживаем только попадания в кэш
+    if db_health.is_down():
+        raise DatabaseUnavailable()
+    version = await get_version(link_scope(short_code))
+    try:
+        # Правила подтягиваются тем же запросом и кэшируются вместе со ссылкой
+        result = await db.execute(
+            select(Link).options(joinedload(Link.rules))
+            .filter(Link.short_code == short_code, Link.is_active == True)
+        )
+        link = result.unique().scalar_one_or_none()
+        db_health.mark_up()
+        if not link or (link.expires_at and link.expires_at <= datetime.now(timezone.utc)):
+            return None
+    except Exception as exc:
+        if not is_db_unavailable(exc):
+            raise
+        db_health.mark_down()
+        raise DatabaseUnavailable() from exc
+    with span("serialization"):
         link_data = LinkSchema.model_validate(link).model_dump(by_alias=True, mode="json")
-        await cache_set(cache_key, link_data)
-        return link
-    return None
+    link_data["targeting"] = compile_rules(link.rules)
+    # Версия прочитана до SELECT, а писатели поднимают её после коммита: если ссылку изменили
+    # после нашего чтения, запись со старой версией читатели отбросят. Промах версию не трогает,
+    # поэтому параллельные промахи не выбивают записи друг друга. Без Redis (версия None)
+    # запись достаётся только локальному кэшу
+    await cache_set_versioned(cache_key, link_data, version)
+    click_buffer.record(short_code)
+    return choose_target(link_data["targeting"], link.original_url, client_ip, user_agent)
 
 async def update_link(db: AsyncSession, short_code: str, link_data: LinkUpdate, current_user: dict):
     result = await db.execute(select(Link).filter(Link.short_code == short_code))
     link = result.scalar_one_or_none()
     if not link or (link.user_id and link.user_id != current_user.get("id")):
         return None
+    old_url = link.original_url
     if link_data.original_url:
         link.original_url = link_data.original_url
     if link_data.expires_at:
         link.expires_at = link_data.expires_at
     await db.commit()
 
-    link_data_cache = LinkSchema.model_validate(link).model_dump(by_alias=True, mode="json")
-    await cache_set(f"link:{short_code}", link_data_cache)
-    await cache_delete(f"link_stats:{short_code}")
-    await cache_set(f"search:{link.original_url}:{current_user['id']}", link_data_cache)
+    await bump_versions(
+        link_scope(short_code), stats_scope(short_code), user_scope(link.user_id),
+        search_scope(link.user_id), search_scope(current_user["id"]),
+    )
+    # Поиски по старому URL (в том числе чужие и анонимные) снимаем по тегу; link: соберёт
+    # следующий читатель, как и в create_link
+    await invalidate_tags(url_tag(old_url), url_tag(link.original_url))
+    await cache_delete_many([link_key(short_code), stats_key(short_code)])
 
     return link
 
@@ -96,19 +160,23 @@ async def delete_link(db: AsyncSession, short_code: str, current_user: dict):
     await db.delete(link)
     await db.commit()
 
-    await cache_delete(f"link:{short_code}")
-    await cache_delete(f"link_stats:{short_code}")
-    await cache_delete(f"search:{link.original_url}:{current_user['id'] if current_user else 'anon'}")
+    await bump_versions(
+        link_scope(short_code), stats_scope(short_code), user_scope(link.user_id), search_scope(link.user_id),
+        search_scope(current_user["id"] if current_user else None),
+    )
+    await invalidate_tags(url_tag(link.original_url))
+    await cache_delete_many([link_key(short_code), stats_key(short_code)])
 
     return True
 
 
 async def get_link_stats(db: AsyncSession, short_code: str):
-    cache_key = f"link_stats:{short_code}"
-    cached = await cache_get(cache_key)
+    cache_key = stats_key(short_code)
+    cached = await cache_get_versioned(cache_key, stats_scope(short_code))
     if cached:
-        return cached
+        return {key: value for key, value in cached.items() if key != VERSION_FIELD}
 
+    version = await get_version(stats_scope(short_code))
     result = await db.execute(select(Link).filter(Link.short_code == short_code))
     link = result.scalar_one_or_none()
     if not link:
@@ -120,41 +188,98 @@ async def get_link_stats(db: AsyncSession, short_code: str):
         "clicks": link.clicks,
         "last_used": link.last_used.isoformat() if link.last_used else None
     }
-    await cache_set(cache_key, stats, ttl=300)
+    await cache_set_versioned(cache_key, stats, version, ttl=300)
     return stats
 
 async def search_link_by_url(db: AsyncSession, original_url: str, current_user: dict | None):
-    cache_key = f"search:{original_url}:{current_user['id'] if current_user else 'anon'}"
-    cached = await cache_get(cache_key)
-    if cached:
-        return LinkSchema.model_validate(cached) if cached else None
+    user_id = current_user["id"] if current_user else None
+    # Ключ поиска включает версию пространства поисков пользователя: после записи
+    # все его поиски разом становятся недостижимыми. Без Redis поиск не кэшируется
+    version = await get_version(search_scope(user_id))
+    cache_key = search_key(original_url, user_id, version) if version is not None else None
+    if cache_key:
+        cached = await cache_get(cache_key)
+        if cached:
+            return LinkSchema.model_validate(cached)
 
     result = await db.execute(select(Link).filter(Link.original_url == original_url, Link.is_active == True))
     link = result.scalar_one_or_none()
     if not link:
-        await cache_set(cache_key, None, ttl=600)
+        if cache_key:
+            await cache_set(cache_key, None, ttl=600, tags=(url_tag(original_url),))
         return None
     if current_user and link.user_id != current_user.get("id"):
         return None
     if link.expires_at and link.expires_at <= datetime.now(timezone.utc):
         return None
-    link_data = LinkSchema.model_validate(link).model_dump(by_alias=True, mode="json")
-    await cache_set(cache_key, link_data, ttl=600)
+    if cache_key:
+        link_data = LinkSchema.model_validate(link).model_dump(by_alias=True, mode="json")
+        await cache_set(cache_key, link_data, ttl=600, tags=(url_tag(original_url),))
     return link
 
 async def get_expired_links(db: AsyncSession, current_user: dict | None):
     now = datetime.now(timezone.utc)
-    query = select(Link).filter(Link.expires_at <= now)
+    query = select(*LINK_COLUMNS).filter(Link.expires_at <= now)
     if current_user:
         query = query.filter(Link.user_id == current_user.get("id"))
     result = await db.execute(query)
-    links = result.scalars().all()
-    return links
+    return result.mappings().all()
 
 async def get_links_project(db: AsyncSession, project: str, current_user: dict | None):
-    query = select(Link).filter(Link.project == project)
+    query = select(*LINK_COLUMNS).filter(Link.project == project)
     if current_user:
         query = query.filter(Link.user_id == current_user.get("id"))
     result = await db.execute(query)
-    links = result.scalars().all()
-    return links
\ No newline at end of file
+    return result.mappings().all()
+
+async def _invalidate_links(rows, user_id: int):
+    # Сначала версии: параллельный читатель уже не сможет вернуть в кэш старую запись под актуальной версией
+    await bump_versions(
+        user_scope(user_id), search_scope(user_id),
+        *(scope for short_code, _ in rows for scope in (link_scope(short_code), stats_scope(short_code))),
+    )
+    await cache_delete_many([key for short_code, _ in rows for key in (link_key(short_code), stats_key(short_code))])
+    await invalidate_tags(*{url_tag(original_url) for _, original_url in rows})
+
+async def _bulk_execute(db: AsyncSession, stmt, current_user: dict) -> int:
+    # Один set-based запрос; RETURNING отдаёт ключи для пакетной инвалидации кэша
+    result = await db.execute(
+        stmt.returning(Link.short_code, Link.original_url),
+        execution_options={"synchronize_session": False},
+    )
+    rows = result.all()
+    await db.commit()
+    await _invalidate_links(rows, current_user["id"])
+    return len(rows)
+
+async def extend_project_links(db: AsyncSession, project: str, data: ProjectExtend, current_user: dict) -> int:
+    stmt = update(Link).where(Link.user_id == current_user["id"], Link.project == project)
+    if data.expires_at:
+        stmt = stmt.values(expires_at=data.expires_at)
+    else:
+        # Бессрочные ссылки не трогаем
+        stmt = stmt.where(Link.expires_at.is_not(None)).values(expires_at=Link.expires_at + data.extend_by)
+    return await _bulk_execute(db, stmt, current_user)
+
+async def expire_project_links(db: AsyncSession, project: str, current_user: dict) -> int:
+    now = datetime.now(timezone.utc)
+    stmt = update(Link).where(
+        Link.user_id == current_user["id"],
+        Link.project == project,
+        (Link.expires_at.is_(None)) | (Link.expires_at > now),
+    ).values(expires_at=now)
+    return await _bulk_execute(db, stmt, current_user)
+
+async def move_project_links(db: AsyncSession, project: str, target_project: str, current_user: dict) -> int:
+    stmt = update(Link).where(Link.user_id == current_user["id"], Link.project == project).values(project=target_project)
+    return await _bulk_execute(db, stmt, current_user)
+
+async def bulk_delete_links(db: AsyncSession, filters: BulkDeleteFilter, current_user: dict) -> int:
+    stmt = delete(Link).where(Link.user_id == current_user["id"])
+    if filters.project is not None:
+        stmt = stmt.where(Link.project == filters.project)
+    if filters.expired_only:
+        stmt = stmt.where(Link.expires_at <= datetime.now(timezone.utc))
+    if filters.created_before:
+        stmt = stmt.where(Link.created_at < filters.created_before)
+    return await _bulk_execute(db, stmt, current_user)
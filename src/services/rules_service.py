@@ -0,0 +1,173 @@
+import csv
+import ipaddress
+import random
+import re
+from bisect import bisect_right
+from functools import lru_cache
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload
+
+from src.cache import cache_delete
+from src.cache_keys import link_key, link_scope
+from src.config import GEOIP_DB_PATH
+from src.models import Link, LinkRule
+from src.schemas.link import LinkRuleCreate
+from src.services.version_service import bump_versions
+
+_BOT = re.compile(r"bot|crawl|spider|slurp|facebookexternalhit|preview", re.I)
+_TABLET = re.compile(r"ipad|tablet|kindle|silk|playbook|android(?!.*mobile)", re.I)
+_MOBILE = re.compile(r"mobi|iphone|ipod|windows phone|blackberry|opera mini", re.I)
+
+_UNKNOWN = object()
+
+
+class GeoIPDatabase:
+    """Определение страны по локальному CSV `network,country_code` (блоки CIDR в стиле GeoLite2)."""
+
+    def __init__(self, path: str):
+        ranges = {4: [], 6: []}
+        with open(path, encoding="utf-8", newline="") as stream:
+            for row in csv.reader(stream):
+                if not row or row[0].startswith("#") or row[0] == "network":
+                    continue
+                network = ipaddress.ip_network(row[0].strip(), strict=False)
+                ranges[network.version].append(
+                    (int(network.network_address), int(network.broadcast_address), row[1].strip().upper())
+                )
+        self._tables = {}
+        for version, items in ranges.items():
+            items.sort()
+            self._tables[version] = (
+                [start for start, _, _ in items], [end for _, end, _ in items], [country for _, _, country in items]
+            )
+
+    def lookup(self, ip: str) -> str | None:
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        starts, ends, countries = self._tables[address.version]
+        value = int(address)
+        index = bisect_right(starts, value) - 1
+        if index >= 0 and value <= ends[index]:
+            return countries[index]
+        return None
+
+
+_geoip: GeoIPDatabase | None = None
+
+
+# База стран загружается при старте воркера: битый или отсутствующий файл роняет старт,
+# а не первый запрос с правилом по стране
+def load_geoip(path: str = GEOIP_DB_PATH) -> GeoIPDatabase | None:
+    global _geoip
+    _geoip = GeoIPDatabase(path) if path else None
+    lookup_country.cache_clear()
+    return _geoip
+
+
+def get_geoip() -> GeoIPDatabase | None:
+    return _geoip
+
+
+@lru_cache(maxsize=65536)
+def lookup_country(ip: str | None) -> str | None:
+    geoip = get_geoip()
+    return geoip.lookup(ip) if geoip and ip else None
+
+
+@lru_cache(maxsize=4096)
+def detect_device(user_agent: str | None) -> str:
+    if not user_agent:
+        return "desktop"
+    if _BOT.search(user_agent):
+        return "bot"
+    if _TABLET.search(user_agent):
+        return "tablet"
+    if _MOBILE.search(user_agent):
+        return "mobile"
+    return "desktop"
+
+
+def compile_rules(rules) -> list | None:
+    """Упаковывает правила в группы `[country, device, cumulative_weights, urls]` по приоритету."""
+    groups = {}
+    for rule in rules:
+        key = (rule.priority, rule.country, rule.device)
+        groups.setdefault(key, []).append((rule.weight, rule.target_url))
+    if not groups:
+        return None
+
+    compiled = []
+    for priority, country, device in sorted(
+        groups, key=lambda key: (key[0], (key[1] is None) + (key[2] is None))
+    ):
+        cumulative, urls, total = [], [], 0
+        for weight, url in groups[(priority, country, device)]:
+            total += weight
+            cumulative.append(total)
+            urls.append(url)
+        compiled.append([country, device, cumulative, urls])
+    return compiled
+
+
+def choose_target(rules: list | None, original_url: str, client_ip: str | None = None,
+                  user_agent: str | None = None) -> str:
+    """Вычисляет правила для запроса; страна и устройство определяются только при необходимости."""
+    if not rules:
+        return original_url
+    country = device = _UNKNOWN
+    for rule_country, rule_device, cumulative, urls in rules:
+        if rule_country is not None:
+            if country is _UNKNOWN:
+                country = lookup_country(client_ip)
+            if rule_country != country:
+                continue
+        if rule_device is not None:
+            if device is _UNKNOWN:
+                device = detect_device(user_agent)
+            if rule_device != device:
+                continue
+        if len(urls) == 1:
+            return urls[0]
+        return urls[bisect_right(cumulative, random.random() * cumulative[-1])]
+    return original_url
+
+
+async def load_compiled_rules(db: AsyncSession, link_ids: list[int]) -> dict[int, list]:
+    """Скомпилированные правила пачки ссылок одним запросом (для прогрева кэша)."""
+    result = await db.execute(
+        select(LinkRule).filter(LinkRule.link_id.in_(link_ids)).order_by(LinkRule.link_id, LinkRule.id)
+    )
+    rules = {}
+    for rule in result.scalars():
+        rules.setdefault(rule.link_id, []).append(rule)
+    return {link_id: compile_rules(items) for link_id, items in rules.items()}
+
+
+async def _get_owned_link(db: AsyncSession, short_code: str, current_user: dict):
+    result = await db.execute(select(Link).options(selectinload(Link.rules)).filter(Link.short_code == short_code))
+    link = result.scalar_one_or_none()
+    if not link or (link.user_id and link.user_id != current_user.get("id")):
+        return None
+    return link
+
+
+async def get_link_rules(db: AsyncSession, short_code: str, current_user: dict):
+    link = await _get_owned_link(db, short_code, current_user)
+    return None if link is None else link.rules
+
+
+async def replace_link_rules(db: AsyncSession, short_code: str, rules: list[LinkRuleCreate], current_user: dict):
+    link = await _get_owned_link(db, short_code, current_user)
+    if link is None:
+        return None
+    link.rules = [LinkRule(**rule.model_dump()) for rule in rules]
+    await db.commit()
+
+    # Скомпилированные правила живут в записи link:, при следующем промахе она соберётся заново
+    await bump_versions(link_scope(short_code))
+    await cache_delete(link_key(short_code))
+    return link.rules
@@ -0,0 +1,98 @@
+import hashlib
+import time
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import Request
+
+from src.cache import cache_execute, PIPELINE_CHUNK
+from src.cache_keys import version_key, version_ts_key
+from src.config import VERSION_TTL
+
+
+async def bump_versions(*scopes: str | None) -> dict[str, int]:
+    """Делает недействительными ETag-и и записи пространств; возвращает подтверждённые новые версии."""
+    scopes = list(dict.fromkeys(scope for scope in scopes if scope))
+    versions = {}
+    if not scopes:
+        return versions
+    now = time.time()
+
+    for offset in range(0, len(scopes), PIPELINE_CHUNK // 3):
+        chunk = scopes[offset:offset + PIPELINE_CHUNK // 3]
+
+        async def operation(client):
+            pipe = client.pipeline(transaction=False)
+            for scope in chunk:
+                pipe.incr(version_key(scope))
+                pipe.expire(version_key(scope), VERSION_TTL)
+                pipe.set(version_ts_key(scope), now, ex=VERSION_TTL)
+            return await pipe.execute()
+
+        results = await cache_execute(operation)
+        if results:
+            versions.update(zip(chunk, results[::3]))
+    return versions
+
+
+async def get_versions(*scopes: str, create: bool = False) -> list[tuple[int, float]] | None:
+    """(версия, время изменения) по пространствам или None без Redis; прочитанные счётчики
+    продлеваются на VERSION_TTL, с `create` недостающий заводится с нулём."""
+    keys = [key for scope in scopes for key in (version_key(scope), version_ts_key(scope))]
+    now = time.time()
+
+    async def operation(client):
+        pipe = client.pipeline(transaction=False)
+        if create:
+            for scope in scopes:
+                pipe.set(version_key(scope), 0, nx=True, ex=VERSION_TTL)
+                pipe.set(version_ts_key(scope), now, nx=True, ex=VERSION_TTL)
+        pipe.mget(keys)
+        # EXPIRE отсутствующий ключ не создаёт: чтение по-прежнему не заводит версий
+        for key in keys:
+            pipe.expire(key, VERSION_TTL)
+        return (await pipe.execute())[len(keys) if create else 0]
+
+    values = await cache_execute(operation)
+    if values is None or any(value is None for value in values):
+        return None
+    return [(int(values[i]), float(values[i + 1])) for i in range(0, len(values), 2)]
+
+
+async def current_versions(*scopes: str) -> list[int] | None:
+    """Версии для записей кэша: 0 для пространства без счётчика, None без Redis."""
+    values = await cache_execute(lambda client: client.mget([version_key(scope) for scope in scopes]))
+    if values is None:
+        return None
+    return [int(value or 0) for value in values]
+
+
+async def get_version(scope: str) -> int | None:
+    versions = await current_versions(scope)
+    return versions[0] if versions else None
+
+
+async def get_validators(*scopes: str, extra: str = "", create: bool = False) -> tuple[str, float] | None:
+    """Слабый ETag и Last-Modified по версиям пространств."""
+    versions = await get_versions(*scopes, create=create)
+    if versions is None:
+        return None
+    digest = hashlib.blake2b(f"{scopes}{versions}{extra}".encode(), digest_size=8).hexdigest()
+    return f'W/"{digest}"', max(modified_at for _, modified_at in versions)
+
+
+def validator_headers(etag: str, last_modified: float) -> dict:
+    return {"ETag": etag, "Last-Modified": formatdate(last_modified, usegmt=True)}
+
+
+def is_not_modified(request: Request, etag: str, last_modified: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag.removeprefix("W/") in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+from src.cache import cache_set_many, VERSION_FIELD
+from src.cache_keys import link_key, link_scope
+from src.config import WARMUP_LIMIT, WARMUP_BATCH_SIZE, WARMUP_BATCH_PAUSE, WARMUP_READY_FRACTION
+from src.database import get_session_maker
+from src.models import Link
+from src.schemas.link import LinkSchema
+from src.services.link_service import LINK_COLUMNS
+from src.services.rules_service import load_compiled_rules
+from src.services.version_service import current_versions
+
+logger = logging.getLogger(__name__)
+
+
+def hot_links_query(limit: int):
+    now = datetime.now(timezone.utc)
+    return (
+        select(*LINK_COLUMNS, Link.user_id)
+        .filter(Link.is_active == True)
+        .filter((Link.expires_at.is_(None)) | (Link.expires_at > now))
+        .order_by(Link.last_used.desc().nulls_last(), Link.clicks.desc().nulls_last())
+        .limit(limit)
+    )
+
+
+class CacheWarmer:
+    """Загружает N самых горячих ссылок в Redis и локальный кэш пачками с паузами."""
+
+    def __init__(
+        self,
+        limit: int = WARMUP_LIMIT,
+        batch_size: int = WARMUP_BATCH_SIZE,
+        pause: float = WARMUP_BATCH_PAUSE,
+        ready_fraction: float = WARMUP_READY_FRACTION,
+    ):
+        self.limit = limit
+        self.batch_size = batch_size
+        self.pause = pause
+        self.ready_fraction = ready_fraction
+        self.total = 0
+        self.loaded = 0
+        self.done = False
+        self.ready = asyncio.Event()
+
+    @property
+    def progress(self) -> float:
+        return self.loaded / self.total if self.total else 1.0
+
+    def status(self) -> dict:
+        return {"loaded": self.loaded, "total": self.total, "done": self.done, "ready": self.ready.is_set()}
+
+    def _update_ready(self):
+        if not self.ready.is_set() and self.progress >= self.ready_fraction:
+            logger.info("Cache warm-up reached ready fraction %.0f%%", self.ready_fraction * 100)
+            self.ready.set()
+
+    async def run(self):
+        try:
+            if self.limit > 0:
+                await self._run()
+        except Exception:
+            logger.exception("Cache warm-up failed after %d links", self.loaded)
+        finally:
+            self.done = True
+            self.ready.set()
+
+    async def _run(self):
+        query = hot_links_query(self.limit)
+        async with get_session_maker()() as session:
+            self.total = (await session.execute(select(func.count()).select_from(query.subquery()))).scalar()
+            logger.info("Cache warm-up: %d links to load", self.total)
+            self._update_ready()
+
+            # Стримим только коды; версии фиксируем до чтения строк батча, так что ссылка,
+            # изменённая после, окажется в кэше со старой версией и будет отброшена
+            codes = query.with_only_columns(Link.id, Link.short_code)
+            result = await session.stream(codes.execution_options(yield_per=self.batch_size))
+            async for batch in result.partitions(self.batch_size):
+                ids = [link_id for link_id, _ in batch]
+                versions = await current_versions(*(link_scope(short_code) for _, short_code in batch))
+                versions = dict(zip(ids, versions)) if versions else {}
+                rows = (await session.execute(
+                    select(*LINK_COLUMNS, Link.user_id).filter(Link.id.in_(ids))
+                )).mappings().all()
+                rules = await load_compiled_rules(session, ids)
+                items = {
+                    link_key(row["short_code"]): {
+                        **LinkSchema.model_validate(dict(row)).model_dump(by_alias=True, mode="json"),
+                        "targeting": rules.get(row["id"]),
+                        VERSION_FIELD: versions.get(row["id"]),
+                    }
+                    for row in rows
+                }
+                await cache_set_many(items)
+                self.loaded += len(items)
+                logger.info("Cache warm-up: %d/%d links", self.loaded, self.total)
+                self._update_ready()
+                # Пауза между батчами, чтобы прогрев не забивал БД
+                await asyncio.sleep(self.pause)
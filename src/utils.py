@@ -1,16 +1,24 @@
-from passlib.context import CryptContext
-
 import random
 import string
 import logging
+from functools import cache
+
+from src.profiling import span
+
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# passlib и bcrypt подгружаются только при первой работе с паролями
+@cache
+def get_pwd_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 def hash_password(password: str):
-    return pwd_context.hash(password)
+    with span("password_hash"):
+        return get_pwd_context().hash(password)
 
 def verify_password(plain_password: str, hashed_password: str):
-    return pwd_context.verify(plain_password, hashed_password)
+    with span("password_hash"):
+        return get_pwd_context().verify(plain_password, hashed_password)
 
 def generate_short_code(length: int = 6) -> str:
     characters = string.ascii_letters + string.digits
@@ -175,3 +175,47 @@ async def test_delete_link(auth_token):
         headers={"Authorization": f"Bearer {token}"}
     )
     assert response.status_code in [200, 404]
+
+
+@pytest.mark.asyncio
+async def test_project_bulk_operations(auth_token):
+    client = TestClient(app)
+    token = await auth_token
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.post(
+        f"/links/project/{TEST_LINK_DATA['project']}/extend",
+        json={"extend_by": 86400},
+        headers=headers
+    )
+    assert response.status_code == 200
+    assert "affected" in response.json()
+
+    response = client.post(
+        f"/links/project/{TEST_LINK_DATA['project']}/move",
+        json={"target_project": "pytest_project_moved"},
+        headers=headers
+    )
+    assert response.status_code == 200
+
+    response = client.post("/links/bulk_delete", json={}, headers=headers)
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_link_rules(auth_token):
+    client = TestClient(app)
+    token = await auth_token
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.put(
+        f"/links/{TEST_LINK_DATA['short_code']}/rules",
+        json={"rules": [{"device": "bot", "target_url": "https://example.com/bot"}]},
+        headers=headers
+    )
+    assert response.status_code in [200, 404]
+
+    response = client.put(
+        f"/links/{TEST_LINK_DATA['short_code']}/rules",
+        json={"rules": [{"country": "germany", "target_url": "https://example.com/de"}]},
+        headers=headers
+    )
+    assert response.status_code == 422
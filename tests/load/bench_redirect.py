@@ -0,0 +1,152 @@
+import asyncio
+import tempfile
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import redis.asyncio as redis
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src import cache
+from src.base import Base
+from src.cache import CircuitBreaker, LocalCache
+from src.cache_keys import link_key, link_scope
+from src.models import Link, LinkRule
+from src.services import rules_service
+from src.services.link_service import get_link
+from src.services.rules_service import compile_rules
+from src.services.version_service import bump_versions
+from tests.unit.fake_redis import FakeRedisServer
+
+CALLS = 20_000
+MISS_CALLS = 500
+ROUNDS = 10
+# Цель: правила добавляют к обычному переходу (попадание в кэш с проверкой версии в Redis) меньше 5%.
+# Без Redis попадание стоит ~2 мкс, и те же ~0.6 мкс на правила дают десятки процентов:
+# для этого режима проверяем абсолютную добавку
+MAX_OVERHEAD_PCT = 5.0
+MAX_LOCAL_OVERHEAD_US = 1.0
+
+CLIENTS = [
+    ("10.1.2.3", "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) Mobile/15E148"),
+    ("10.9.9.9", "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/120.0"),
+    ("192.0.2.7", "Mozilla/5.0 (Linux; Android 14; Pixel 8) Mobile Safari/537.36"),
+    ("198.51.100.1", "Mozilla/5.0 (iPad; CPU OS 17_0 like Mac OS X)"),
+]
+
+RULES = [
+    SimpleNamespace(priority=0, country="DE", device="mobile", weight=100, target_url="https://example.com/de/m"),
+    SimpleNamespace(priority=0, country="DE", device=None, weight=50, target_url="https://example.com/de/a"),
+    SimpleNamespace(priority=0, country="DE", device=None, weight=50, target_url="https://example.com/de/b"),
+    SimpleNamespace(priority=1, country=None, device="tablet", weight=100, target_url="https://example.com/tablet"),
+    SimpleNamespace(priority=2, country=None, device=None, weight=90, target_url="https://example.com/a"),
+    SimpleNamespace(priority=2, country=None, device=None, weight=10, target_url="https://example.com/b"),
+]
+
+
+def setup():
+    """Попадания в локальный кэш, в БД запросы не идут"""
+    cache.local_cache = LocalCache(maxsize=100, ttl=3600)
+
+    geo = tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False)
+    geo.write("network,country_code\n10.0.0.0/8,DE\n192.0.2.0/24,FR\n198.51.100.0/24,US\n")
+    geo.close()
+    rules_service.load_geoip(geo.name)
+
+    now = datetime.now(timezone.utc).isoformat()
+    for code, targeting in (("plain", None), ("rules", compile_rules(RULES))):
+        cache.local_cache.set(f"link:{code}", {
+            "id": 1, "original_url": "https://example.com/", "short_code": code, "created_at": now,
+            "user_id": None, "expires_at": None, "clicks": 0, "last_used": None, "project": None,
+            "is_active": True, "targeting": targeting, "_v": 1,
+        })
+
+
+async def run(short_code: str, calls: int) -> float:
+    start = time.perf_counter()
+    for i in range(calls):
+        client_ip, user_agent = CLIENTS[i % len(CLIENTS)]
+        await get_link(None, short_code, client_ip, user_agent)
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+async def compare(calls: int, runner=run) -> tuple[float, float]:
+    # Раунды чередуются, чтобы фоновый шум одинаково влиял на оба варианта
+    plain_us = rules_us = float("inf")
+    for _ in range(ROUNDS):
+        plain_us = min(plain_us, await runner("plain", calls))
+        rules_us = min(rules_us, await runner("rules", calls))
+    return plain_us, rules_us
+
+
+async def setup_db(path: str) -> async_sessionmaker:
+    """SQLite с двумя ссылками: без правил и с 6 правилами, которые промах тянет через joinedload"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    async with session_maker() as db:
+        for code, rules in (("plain", []), ("rules", RULES)):
+            db.add(Link(
+                short_code=code, original_url="https://example.com/", created_at=datetime.now(timezone.utc),
+                clicks=0, is_active=True, rules=[LinkRule(**vars(rule)) for rule in rules],
+            ))
+        await db.commit()
+    return session_maker
+
+
+def miss_runner(session_maker: async_sessionmaker):
+    async def run_miss(short_code: str, calls: int) -> float:
+        start = time.perf_counter()
+        for i in range(calls):
+            # Каждый вызов - промах: запись из локального кэша убираем заранее
+            cache.local_cache.delete(link_key(short_code))
+            client_ip, user_agent = CLIENTS[i % len(CLIENTS)]
+            async with session_maker() as db:
+                await get_link(db, short_code, client_ip, user_agent)
+        return (time.perf_counter() - start) / calls * 1e6
+    return run_miss
+
+
+def overhead(plain_us: float, rules_us: float) -> float:
+    return (rules_us / plain_us - 1) * 100
+
+
+async def main():
+    setup()
+    # Обычный режим: локальное попадание сверяет версию записи одним GET в Redis
+    server = await FakeRedisServer().start()
+    cache.redis_client = redis.from_url(server.url)
+    await bump_versions(link_scope("plain"), link_scope("rules"))
+    redis_plain, redis_rules = await compare(CALLS // 10)
+    await cache.redis_client.aclose()
+
+    # Худший случай для накладных расходов: Redis отключён открытым breaker-ом
+    cache.breaker = CircuitBreaker(1, 3600)
+    cache.breaker.record_failure()
+    plain_us, rules_us = await compare(CALLS)
+    compiled = compile_rules(RULES)
+    eval_us = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for i in range(CALLS):
+            rules_service.choose_target(compiled, "https://example.com/", *CLIENTS[i % len(CLIENTS)])
+        eval_us = min(eval_us, (time.perf_counter() - start) / CALLS * 1e6)
+
+    # Промах: запрос ссылки вместе с правилами (joinedload), сериализация и компиляция правил
+    with tempfile.TemporaryDirectory() as directory:
+        miss_plain, miss_rules = await compare(MISS_CALLS, miss_runner(await setup_db(f"{directory}/links.db")))
+
+    print(f"with Redis:  no rules {redis_plain:.2f} us, 6 rules {redis_rules:.2f} us, "
+          f"overhead {overhead(redis_plain, redis_rules):.1f}%")
+    print(f"local only:  no rules {plain_us:.2f} us, 6 rules {rules_us:.2f} us, "
+          f"overhead {overhead(plain_us, rules_us):.1f}%")
+    print(f"rule evaluation only: {eval_us:.2f} us/call")
+    print(f"cache miss:  no rules {miss_plain:.0f} us, 6 rules {miss_rules:.0f} us, "
+          f"overhead {overhead(miss_plain, miss_rules):.1f}%")
+    assert overhead(redis_plain, redis_rules) < MAX_OVERHEAD_PCT, "redirect rules overhead exceeds the budget"
+    assert rules_us - plain_us < MAX_LOCAL_OVERHEAD_US, "rule evaluation on local hits got slower"
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+
+from src.base import Base
+from src.models import Link
+from src.responses import LeanJSONResponse
+from src.schemas.link import Link as LinkOut
+from src.services.link_service import LINK_COLUMNS
+
+ROWS = 20_000
+ROUNDS = 5
+
+
+def fill(engine):
+    """Заполнение in-memory SQLite тестовыми ссылками"""
+    Base.metadata.create_all(engine)
+    now = datetime.now(timezone.utc)
+    rows = [
+        {
+            "short_code": f"c{i:08d}",
+            "original_url": f"https://example.com/{i}",
+            "created_at": now,
+            "expires_at": now + timedelta(days=1),
+            "clicks": i,
+            "last_used": now,
+            "is_active": True,
+            "project": "bench",
+        }
+        for i in range(ROWS)
+    ]
+    with engine.begin() as conn:
+        conn.execute(insert(Link), rows)
+
+
+def orm_path(session):
+    """Текущий путь: ORM-объекты -> валидация response_model -> json"""
+    links = session.execute(select(Link)).scalars().all()
+    adapter = TypeAdapter(list[LinkOut])
+    data = adapter.dump_python(adapter.validate_python(links, from_attributes=True), mode="json")
+    body = json.dumps(data).encode()
+    session.expunge_all()
+    return body
+
+
+def lean_path(session):
+    """Lean путь: Core-колонки -> RowMapping -> orjson"""
+    rows = session.execute(select(*LINK_COLUMNS)).mappings().all()
+    return LeanJSONResponse(rows).body
+
+
+def measure(func, session):
+    best = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        func(session)
+        best = min(best, time.perf_counter() - start)
+    return best / ROWS * 1e6
+
+
+if __name__ == "__main__":
+    engine = create_engine("sqlite://")
+    fill(engine)
+    with Session(engine) as session:
+        orm_us = measure(orm_path, session)
+        lean_us = measure(lean_path, session)
+    print(f"ORM -> Pydantic: {orm_us:.2f} us/row")
+    print(f"Core -> orjson:  {lean_us:.2f} us/row")
+    print(f"speedup:         {orm_us / lean_us:.1f}x")
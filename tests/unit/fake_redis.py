@@ -0,0 +1,162 @@
+import asyncio
+import time
+
+
+class FakeRedisServer:
+    """Minimal RESP server standing in for Redis in tests.
+
+    Supports the handful of commands the service uses and can be paused
+    (connections stay open, replies are held back) or killed mid-test."""
+
+    def __init__(self):
+        self.data = {}
+        self.commands = 0
+        self.port = None
+        self._server = None
+        self._writers = set()
+        self._running = asyncio.Event()
+        self._running.set()
+
+    async def start(self, port: int = 0):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    @property
+    def url(self) -> str:
+        return f"redis://127.0.0.1:{self.port}/0"
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    async def kill(self):
+        self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        self._writers.add(writer)
+        try:
+            while True:
+                command = await self._read_command(reader)
+                if command is None:
+                    break
+                await self._running.wait()
+                self.commands += 1
+                writer.write(self._execute(command))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    @staticmethod
+    async def _read_command(reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        count = int(line[1:])
+        args = []
+        for _ in range(count):
+            size = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(size + 2))[:-2])
+        return args
+
+    def _get(self, key):
+        item = self.data.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires is not None and expires < time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def _execute(self, args) -> bytes:
+        name = args[0].upper()
+        if name == b"GET":
+            return self._bulk(self._get(args[1]))
+        if name == b"GETDEL":
+            value = self._get(args[1])
+            self.data.pop(args[1], None)
+            return self._bulk(value)
+        if name == b"SET":
+            options = [arg.upper() for arg in args[3:]]
+            if b"NX" in options and self._get(args[1]) is not None:
+                return b"$-1\r\n"
+            expires = None
+            if b"EX" in options:
+                expires = time.monotonic() + int(args[3 + options.index(b"EX") + 1])
+            self.data[args[1]] = (args[2], expires)
+            return b"+OK\r\n"
+        if name == b"SETEX":
+            self.data[args[1]] = (args[3], time.monotonic() + int(args[2]))
+            return b"+OK\r\n"
+        if name in (b"DEL", b"UNLINK"):
+            removed = sum(self.data.pop(key, None) is not None for key in args[1:])
+            return b":%d\r\n" % removed
+        if name in (b"INCR", b"INCRBY"):
+            value = int(self._get(args[1]) or 0) + (int(args[2]) if len(args) > 2 else 1)
+            expires = self.data[args[1]][1] if args[1] in self.data else None
+            self.data[args[1]] = (str(value).encode(), expires)
+            return b":%d\r\n" % value
+        if name == b"EXPIRE":
+            if self._get(args[1]) is None:
+                return b":0\r\n"
+            self.data[args[1]] = (self.data[args[1]][0], time.monotonic() + int(args[2]))
+            return b":1\r\n"
+        if name == b"PERSIST":
+            if self._get(args[1]) is None:
+                return b":0\r\n"
+            self.data[args[1]] = (self.data[args[1]][0], None)
+            return b":1\r\n"
+        if name == b"MGET":
+            return b"*%d\r\n" % (len(args) - 1) + b"".join(self._bulk(self._get(key)) for key in args[1:])
+        if name == b"EXISTS":
+            return b":%d\r\n" % sum(self._get(key) is not None for key in args[1:])
+        if name == b"GETBIT":
+            bitmap, offset = self._get(args[1]) or b"", int(args[2])
+            byte = bitmap[offset // 8] if offset // 8 < len(bitmap) else 0
+            return b":%d\r\n" % ((byte >> (7 - offset % 8)) & 1)
+        if name == b"SETBIT":
+            bitmap, offset = self._get(args[1]), int(args[2])
+            if not isinstance(bitmap, bytearray):
+                bitmap = bytearray(bitmap or b"")
+                self.data[args[1]] = (bitmap, None)
+            if offset // 8 >= len(bitmap):
+                bitmap.extend(bytes(offset // 8 + 1 - len(bitmap)))
+            mask = 1 << (7 - offset % 8)
+            old = int(bool(bitmap[offset // 8] & mask))
+            bitmap[offset // 8] = bitmap[offset // 8] | mask if args[3] == b"1" else bitmap[offset // 8] & ~mask
+            return b":%d\r\n" % old
+        if name == b"RENAME":
+            if args[1] not in self.data:
+                return b"-ERR no such key\r\n"
+            self.data[args[2]] = self.data.pop(args[1])
+            return b"+OK\r\n"
+        if name == b"SADD":
+            members = self._get(args[1])
+            if members is None:
+                members = set()
+                self.data[args[1]] = (members, None)
+            added = len(set(args[2:]) - members)
+            members.update(args[2:])
+            return b":%d\r\n" % added
+        if name == b"SMEMBERS":
+            members = self._get(args[1]) or set()
+            return b"*%d\r\n" % len(members) + b"".join(self._bulk(member) for member in members)
+        if name == b"PING":
+            return b"+PONG\r\n"
+        # CLIENT SETINFO и прочие служебные команды при подключении
+        return b"+OK\r\n"
+
+    @staticmethod
+    def _bulk(value) -> bytes:
+        if value is None:
+            return b"$-1\r\n"
+        return b"$%d\r\n%s\r\n" % (len(value), bytes(value))